@@ -0,0 +1,89 @@
+# Rows/sec of the execute() row conversion on a 20-column table:
+# the former per-row dict loop against the compiled RowDecoder.
+#
+#   python benchmarks/bench_row_decode.py [rows]
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cassandra-fdw'))
+
+import cassandra_types
+import types_mapper
+import row_decoders
+
+ROWID_COLUMN = u"__rowid__"
+SCHEMA = [('id', 'uuid'), ('ts', 'timestamp')] + \
+    [('i{0}'.format(i), 'int') for i in range(0, 8)] + \
+    [('t{0}'.format(i), 'text') for i in range(0, 6)] + \
+    [('d{0}'.format(i), 'double') for i in range(0, 2)] + \
+    [('updated', 'timestamp'), ('m', 'map<text, int>')]
+COLUMNS = [c for c, t in SCHEMA]
+COLUMNS_TYPES = dict((c, types_mapper.get_cql_type_from_validator(t)) for c, t in SCHEMA)
+ROWID_COLUMNS = ['id', 'ts']
+
+
+def make_rows(count):
+    now = datetime(2017, 1, 1, 12, 30, 15, 123000)
+    rows = []
+    for n in range(0, count):
+        rows.append((uuid4(), now) + tuple(range(n, n + 8)) + tuple([u'text value {0}'.format(i) for i in range(0, 6)]) +
+                    (n * 0.5, n * 1.5, now, {u'a': n, u'b': n + 1}))
+    return rows
+
+
+def legacy_decode(rows, filtered_columns, columns_types, rowid_columns):
+    for row in rows:
+        line = {}
+        idx = 0
+        for column_name in filtered_columns:
+            value = row[idx]
+            if columns_types[column_name].main_type == cassandra_types.cql_timestamp and value is not None:
+                line[column_name] = u"{0}+00:00".format(value)
+            elif columns_types[column_name].main_type == cassandra_types.cql_time and value is not None:
+                line[column_name] = u"{0}+00:00".format(value)
+            elif isinstance(value, tuple):
+                line[column_name] = json.dumps([str(t) for t in value])
+            elif isinstance(value, dict):
+                dict_values = {}
+                for i in value:
+                    dict_values[str(i)] = str(value[i])
+                line[column_name] = json.dumps(dict_values)
+            else:
+                line[column_name] = value
+            idx = idx + 1
+        rowid_values = []
+        for idcolumn in rowid_columns:
+            rowid_values.append(unicode(line[idcolumn]))
+        line[ROWID_COLUMN] = json.dumps(rowid_values)
+        yield line
+
+
+def compiled_decode(rows, filtered_columns, columns_types, rowid_columns):
+    decode = row_decoders.RowDecoder(COLUMNS + [ROWID_COLUMN], filtered_columns, columns_types, ROWID_COLUMN, rowid_columns).decode
+    for row in rows:
+        yield decode(row)
+
+
+def measure(fn, rows):
+    start = time.time()
+    for line in fn(rows, COLUMNS, COLUMNS_TYPES, ROWID_COLUMNS):
+        pass
+    return len(rows) / (time.time() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rows = make_rows(count)
+    legacy = max(measure(legacy_decode, rows) for i in range(0, 3))
+    compiled = max(measure(compiled_decode, rows) for i in range(0, 3))
+    print("legacy dict rows:    {0:>10.0f} rows/sec".format(legacy))
+    print("compiled tuple rows: {0:>10.0f} rows/sec".format(compiled))
+    print("speedup:             {0:>10.2f}x".format(compiled / legacy))
+
+
+if __name__ == '__main__':
+    main()
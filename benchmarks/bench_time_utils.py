@@ -0,0 +1,61 @@
+# Timestamp/time codec throughput in both directions.
+#
+#   python benchmarks/bench_time_utils.py [values]
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cassandra-fdw'))
+
+import time_utils
+
+
+class DriverTime(object):
+    # Stand-in for cassandra.util.Time
+    def __init__(self, hour, minute, second, nanosecond):
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.nanosecond = nanosecond
+
+
+def measure(fn, values):
+    best = 0
+    for i in range(0, 3):
+        start = time.time()
+        for value in values:
+            fn(value)
+        best = max(best, len(values) / (time.time() - start))
+    return best
+
+
+def clear_memo(fn):
+    def run(value):
+        time_utils._date_memo.clear()
+        time_utils._time_memo.clear()
+        return fn(value)
+    return run
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start = datetime(2017, 1, 1, 0, 0, 0)
+    stamps = [start + timedelta(seconds=n, microseconds=n * 37 % 1000000) for n in range(0, count)]
+    timestamp_strings = ["{0}+03".format(s) for s in stamps]
+    repeated_strings = timestamp_strings[:100] * (count // 100)
+    time_strings = ["{0}-05:30".format(s.time()) for s in stamps]
+    driver_times = [DriverTime(s.hour, s.minute, s.second, s.microsecond * 1000) for s in stamps]
+
+    print("encode (PostgreSQL text -> driver value)")
+    print("  timestamp, distinct:   {0:>10.0f} values/sec".format(measure(clear_memo(time_utils.parse_date_string), timestamp_strings)))
+    print("  timestamp, repeated:   {0:>10.0f} values/sec".format(measure(time_utils.parse_date_string, repeated_strings)))
+    print("  time, distinct:        {0:>10.0f} values/sec".format(measure(clear_memo(time_utils.parse_time_string), time_strings)))
+    print("decode (driver value -> PostgreSQL)")
+    print("  timestamp, text:       {0:>10.0f} values/sec".format(measure(lambda v: u"{0}+00:00".format(v), stamps)))
+    print("  timestamp, datetime:   {0:>10.0f} values/sec".format(measure(time_utils.from_cassandra_timestamp, stamps)))
+    print("  time, datetime.time:   {0:>10.0f} values/sec".format(measure(time_utils.from_cassandra_time, driver_times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+# In-process stand-ins for the cassandra driver and multicorn, enough to run
+# CassandraProvider/CassandraFDW without a cluster or a PostgreSQL backend.
+# install() must be called before any cassandra-fdw module is imported.
+import calendar
+import copy
+import os
+import pickle
+import re
+import struct
+import sys
+import types
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+# Only the last statements are recorded, so long runs don't retain every request
+RECORDED_STATEMENTS = 1000
+FDW_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cassandra-fdw')
+SELECT_RE = re.compile(r'^\s*SELECT\s+(.*?)\s+FROM\s+(\w+)\.(\w+)(.*)$', re.I | re.S)
+INSERT_RE = re.compile(r'^\s*INSERT\s+INTO\s+(\w+)\.(\w+)\s*\(([^)]*)\)', re.I)
+DELETE_RE = re.compile(r'^\s*DELETE\s+FROM\s+(\w+)\.(\w+)', re.I)
+WHERE_COLUMN_RE = re.compile(r'(\w+)\s*=\s*\?')
+CONSISTENCY_LEVELS = {'ANY': 0, 'ONE': 1, 'TWO': 2, 'THREE': 3, 'QUORUM': 4, 'ALL': 5, 'LOCAL_QUORUM': 6,
+                      'EACH_QUORUM': 7, 'SERIAL': 8, 'LOCAL_SERIAL': 9, 'LOCAL_ONE': 10}
+# Keyspaces as stored by the cluster, what the driver metadata is fetched from
+SCHEMA = {}
+# Changed by tests altering SCHEMA, in a list so it is changed in place
+SCHEMA_VERSION = ['6e2a0fe4-3f2b-3d1c-9b9e-000000000001']
+
+
+class Qual(object):
+
+    def __init__(self, field_name, operator, value):
+        self.field_name = field_name
+        self.operator = operator
+        self.value = value
+
+    def __repr__(self):
+        return u"{0} {1} {2!r}".format(self.field_name, self.operator, self.value)
+
+
+class SortKey(object):
+
+    def __init__(self, attname, is_reversed=False, collate=None):
+        self.attname = attname
+        self.is_reversed = is_reversed
+        self.nulls_first = is_reversed
+        self.collate = collate
+
+
+class Statement(object):
+
+    def __init__(self, query_string=None, fetch_size=None, **kwargs):
+        self.query_string = query_string
+        self.fetch_size = fetch_size
+        self.consistency_level = None
+        self.is_idempotent = False
+        self.routing_key = None
+
+
+class SimpleStatement(Statement):
+    pass
+
+
+class BoundStatement(Statement):
+
+    def __init__(self, prepared, values):
+        Statement.__init__(self, prepared.query_string)
+        self.prepared = prepared
+        self.values = list(values)
+        if prepared.routing_indexes:
+            self.routing_key = tuple([self.values[i] for i in prepared.routing_indexes])
+
+
+class PreparedStatement(object):
+
+    def __init__(self, query_string, routing_indexes, column_metadata=None):
+        self.query_string = query_string
+        self.routing_indexes = routing_indexes
+        self.column_metadata = column_metadata or []
+
+    def bind(self, values):
+        return BoundStatement(self, values)
+
+
+class BatchType(object):
+    LOGGED = 0
+    UNLOGGED = 1
+    COUNTER = 2
+
+
+class BatchStatement(Statement):
+
+    def __init__(self, batch_type=BatchType.LOGGED, **kwargs):
+        Statement.__init__(self)
+        self.batch_type = batch_type
+        self.statements = []
+
+    def add(self, statement, parameters=None):
+        self.statements.append(statement)
+        if self.routing_key is None:
+            self.routing_key = statement.routing_key
+
+
+class ValueSequence(list):
+    pass
+
+
+UNSET_VALUE = object()
+
+
+class DriverType(object):
+    # serialize/deserialize like the driver's cqltypes, pickle for the rest
+
+    def __init__(self, pack, unpack):
+        self.pack = pack
+        self.unpack = unpack
+
+    def serialize(self, value, protocol_version):
+        return self.pack(value)
+
+    def deserialize(self, data, protocol_version):
+        return self.unpack(data)
+
+
+EPOCH = datetime(1970, 1, 1)
+DRIVER_TYPES = {
+    'text': DriverType(lambda v: v.encode('utf8'), lambda b: b.decode('utf8')),
+    'int': DriverType(lambda v: struct.pack('>i', v), lambda b: struct.unpack('>i', b)[0]),
+    'bigint': DriverType(lambda v: struct.pack('>q', v), lambda b: struct.unpack('>q', b)[0]),
+    'timestamp': DriverType(lambda v: struct.pack('>q', calendar.timegm(v.utctimetuple()) * 1000 + v.microsecond // 1000),
+                            lambda b: EPOCH + timedelta(milliseconds=struct.unpack('>q', b)[0]))
+}
+PICKLED = DriverType(lambda v: pickle.dumps(v, 2), pickle.loads)
+
+
+class BindMarker(object):
+
+    def __init__(self, column):
+        self.name = column.name
+        self.type = DRIVER_TYPES.get(column.cql_type, PICKLED)
+
+
+class Column(object):
+
+    def __init__(self, name, cql_type, is_reversed=False):
+        self.name = name
+        self.cql_type = cql_type
+        self.is_reversed = is_reversed
+
+
+class Table(object):
+    # Rows are tuples in column order, grouped by partition key
+
+    def __init__(self, name, columns, partition_key, clustering_key, rows):
+        self.name = name
+        self.columns = OrderedDict([(c, Column(c, t)) for c, t in columns])
+        self.partition_key = [self.columns[c] for c in partition_key]
+        self.clustering_key = [self.columns[c] for c in clustering_key]
+        self.indexes = {}
+        self.column_names = [c for c, t in columns]
+        self.partitions = OrderedDict()
+        key_positions = [self.column_names.index(c) for c in partition_key]
+        for row in rows:
+            self.partitions.setdefault(tuple([row[i] for i in key_positions]), []).append(row)
+
+
+class Keyspace(object):
+
+    def __init__(self, tables):
+        self.tables = dict([(t.name, t) for t in tables])
+        self.views = {}
+
+
+class Metadata(object):
+
+    def __init__(self):
+        self.keyspaces = {}
+        self.token_map = None
+
+    def all_hosts(self):
+        return []
+
+
+class Result(object):
+
+    def __init__(self, rows, paging_state=None):
+        self.current_rows = rows
+        self.paging_state = paging_state
+
+    def __iter__(self):
+        return iter(self.current_rows)
+
+
+class Future(object):
+
+    def __init__(self, result):
+        self.attempted_hosts = ['127.0.0.1']
+        self.result_value = result
+
+    def result(self):
+        return self.result_value
+
+    def add_callbacks(self, callback, errback):
+        callback(self.result_value.current_rows)
+
+
+class Session(object):
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.statements = deque(maxlen=RECORDED_STATEMENTS)
+        self.executed = 0
+        self.projections = {}
+
+    def prepare(self, query):
+        routing_indexes = None
+        match = INSERT_RE.match(query)
+        if match is not None:
+            table = SCHEMA[match.group(1)].tables[match.group(2)]
+            columns = [c.strip().strip('"') for c in match.group(3).split(',')]
+            routing_indexes = [columns.index(c.name) for c in table.partition_key]
+        elif DELETE_RE.match(query) is not None or ' WHERE ' in query and '?' in query:
+            routing_indexes = [0]
+        column_metadata = []
+        match = DELETE_RE.match(query)
+        if match is not None:
+            table = SCHEMA[match.group(1)].tables[match.group(2)]
+            column_metadata = [BindMarker(table.columns[c]) for c in WHERE_COLUMN_RE.findall(query)]
+        return PreparedStatement(query, routing_indexes, column_metadata)
+
+    def execute(self, statement, parameters=None, **kwargs):
+        return self.execute_async(statement, parameters, **kwargs).result()
+
+    def execute_async(self, statement, parameters=None, paging_state=None, host=None, **kwargs):
+        if isinstance(statement, basestring):
+            statement = SimpleStatement(statement)
+        self.statements.append(statement)
+        self.executed += 1
+        return Future(self.run(statement, parameters, paging_state))
+
+    def run(self, statement, parameters, paging_state):
+        if isinstance(statement, BatchStatement) or statement.query_string is None:
+            return Result([])
+        query = statement.query_string
+        if 'system.local' in query:
+            return Result([(SCHEMA_VERSION[0],)])
+        if 'system.' in query:
+            return Result([])
+        match = SELECT_RE.match(query)
+        if match is None:
+            return Result([])
+        table, positions = self.get_projection(match)
+        values = getattr(statement, 'values', None) or parameters or []
+        rows = self.find_rows(table, match.group(4), values)
+        start = paging_state or 0
+        end = len(rows)
+        if statement.fetch_size:
+            end = min(end, start + statement.fetch_size)
+        page = [tuple([row[i] for i in positions]) for row in rows[start:end]]
+        return Result(page, end if end < len(rows) else None)
+
+    def get_projection(self, match):
+        key = match.group(0)
+        projection = self.projections.get(key, None)
+        if projection is None:
+            table = SCHEMA[match.group(2)].tables[match.group(3)]
+            columns = [c.strip().strip('"') for c in match.group(1).split(',')]
+            projection = (table, [table.column_names.index(c) for c in columns])
+            self.projections[key] = projection
+        return projection
+
+    def find_rows(self, table, where, values):
+        # Partition key restrictions by = or IN are honoured, anything else is a full scan
+        key_size = len(table.partition_key)
+        if 'token(' not in where and len(values) >= key_size and where.strip().upper().startswith('WHERE'):
+            lists = [v if isinstance(v, list) else [v] for v in values[:key_size]]
+            rows = []
+            for key in product(lists):
+                rows.extend(table.partitions.get(key, []))
+            return rows
+        if 'token(' in where and values and values[0] != -2 ** 63:
+            return []
+        rows = []
+        for partition in table.partitions.itervalues():
+            rows.extend(partition)
+        return rows
+
+    def shutdown(self):
+        pass
+
+
+def product(lists):
+    if len(lists) == 0:
+        return [()]
+    return [(v,) + rest for v in lists[0] for rest in product(lists[1:])]
+
+
+class Cluster(object):
+
+    protocol_version = 4
+
+    def __init__(self, contact_points=None, schema_metadata_enabled=True, **kwargs):
+        self.contact_points = contact_points
+        self.auth_provider = None
+        self.session = None
+        # Like the driver, without schema metadata nothing is known until refreshed
+        self.metadata = Metadata()
+        if schema_metadata_enabled:
+            for name in SCHEMA:
+                self.refresh_keyspace_metadata(name)
+                self.metadata.keyspaces[name].tables.update(SCHEMA[name].tables)
+                self.metadata.keyspaces[name].views.update(SCHEMA[name].views)
+
+    def connect(self, keyspace=None):
+        self.session = Session(self)
+        return self.session
+
+    def refresh_keyspace_metadata(self, keyspace):
+        # Only the keyspace itself, the tables already known are kept
+        known = self.metadata.keyspaces.get(keyspace, None)
+        refreshed = Keyspace([])
+        if known is not None:
+            refreshed.tables.update(known.tables)
+            refreshed.views.update(known.views)
+        self.metadata.keyspaces[keyspace] = refreshed
+
+    def refresh_table_metadata(self, keyspace, table):
+        # A table is dropped from, or added to, a keyspace already known
+        known = self.metadata.keyspaces.get(keyspace, None)
+        if known is None:
+            return
+        known.tables.pop(table, None)
+        if table in SCHEMA[keyspace].tables:
+            known.tables[table] = copy.copy(SCHEMA[keyspace].tables[table])
+
+    def refresh_materialized_view_metadata(self, keyspace, view):
+        known = self.metadata.keyspaces.get(keyspace, None)
+        if known is None:
+            return
+        known.views.pop(view, None)
+        if view in SCHEMA[keyspace].views:
+            known.views[view] = copy.copy(SCHEMA[keyspace].views[view])
+
+    def shutdown(self):
+        pass
+
+
+class Stub(object):
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+def execute_concurrent(session, statements_and_params, **kwargs):
+    return [session.execute(statement, params) for statement, params in statements_and_params]
+
+
+def log_to_postgres(message, level=0, hint=None, detail=None):
+    if level >= 3:
+        raise Exception(message)
+
+
+def module(name, **attributes):
+    m = types.ModuleType(name)
+    m.__dict__.update(attributes)
+    sys.modules[name] = m
+    return m
+
+
+def install():
+    install_multicorn()
+    consistency = type('ConsistencyLevel', (object,), dict(CONSISTENCY_LEVELS))
+    consistency.name_to_value = CONSISTENCY_LEVELS
+    module('cassandra', ConsistencyLevel=consistency)
+    module('cassandra.cluster', Cluster=Cluster, ExecutionProfile=Stub, EXEC_PROFILE_DEFAULT='default')
+    module('cassandra.policies', TokenAwarePolicy=Stub, DCAwareRoundRobinPolicy=Stub, ConstantSpeculativeExecutionPolicy=Stub)
+    module('cassandra.auth', PlainTextAuthProvider=Stub)
+    module('cassandra.metadata', Metadata=Metadata)
+    module('cassandra.query', SimpleStatement=SimpleStatement, BatchStatement=BatchStatement, BatchType=BatchType,
+           ValueSequence=ValueSequence, UNSET_VALUE=UNSET_VALUE, tuple_factory=lambda colnames, rows: rows)
+    module('cassandra.concurrent', execute_concurrent=execute_concurrent)
+
+
+def install_multicorn():
+    # Alone, for scripts running the FDW against a real cluster
+    module('multicorn', ForeignDataWrapper=type('ForeignDataWrapper', (object,), {'__init__': lambda self, options, columns: None}),
+           TableDefinition=Stub, ColumnDefinition=Stub)
+    module('multicorn.utils', log_to_postgres=log_to_postgres, DEBUG=0, INFO=1, WARNING=2, ERROR=3)
+    if FDW_PATH not in sys.path:
+        sys.path.insert(0, FDW_PATH)
+
+
+def add_table(keyspace, table):
+    keyspaces = SCHEMA
+    if keyspace not in keyspaces:
+        keyspaces[keyspace] = Keyspace([])
+    keyspaces[keyspace].tables[table.name] = table
@@ -0,0 +1,318 @@
+# Representative FDW workloads against the in-process fake Cassandra of
+# fake_cassandra.py: no cluster and no PostgreSQL are needed.
+#
+#   python benchmarks/run_benchmarks.py [--quick] [--only name,...]
+#                                       [--save results.json]
+#                                       [--baseline results.json] [--threshold 0.25]
+#
+# With --baseline the run fails (exit code 1) when a workload is more than
+# `threshold` slower than in the baseline file written by --save. Baselines
+# are machine specific, compare runs made on the same host.
+import gc
+import itertools
+import json
+import optparse
+import resource
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+from fake_cassandra import Qual, SortKey
+from cassandra_provider import CassandraProvider
+
+KEYSPACE = 'bench'
+ROWID_COLUMN = CassandraProvider.ROWIDCOLUMN
+EVENTS_SCHEMA = [('id', 'text'), ('ts', 'timestamp'), ('seq', 'int'), ('kind', 'text'), ('amount', 'double'),
+                 ('count', 'bigint'), ('label', 'text'), ('attrs', 'map<text, int>')]
+TIMES_SCHEMA = [('id', 'int'), ('created', 'timestamp'), ('updated', 'timestamp'), ('seen', 'timestamp'),
+                ('started', 'timestamp'), ('ended', 'timestamp'), ('at', 'time')]
+COUNTERS_SCHEMA = [('page', 'text'), ('day', 'int'), ('hits', 'counter'), ('bytes', 'counter')]
+ATTRIBUTES_SCHEMA = [('id', 'int'), ('attrs', 'map<text, int>'), ('flags', 'map<text, boolean>'),
+                     ('location', 'frozen<tuple<double, double, text>>')]
+
+
+class DriverTime(object):
+    # Stand-in for cassandra.util.Time
+    def __init__(self, hour, minute, second, nanosecond):
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.nanosecond = nanosecond
+
+
+def make_events(partitions, rows_per_partition):
+    start = datetime(2017, 1, 1)
+    rows = []
+    for p in range(0, partitions):
+        for r in range(0, rows_per_partition):
+            rows.append((u'device-{0}'.format(p), start + timedelta(seconds=r), r, u'kind-{0}'.format(r % 7),
+                         r * 0.25, long(p * r), u'label {0} {1}'.format(p, r), {u'a': r, u'b': p}))
+    return rows
+
+
+def make_times(count):
+    start = datetime(2017, 1, 1)
+    return [(n, start + timedelta(seconds=n), start + timedelta(minutes=n), start + timedelta(hours=n % 1000),
+             start + timedelta(milliseconds=n), start + timedelta(days=n % 365), DriverTime(n % 24, n % 60, n % 60, n * 1000))
+            for n in range(0, count)]
+
+
+def make_attributes(count, entries):
+    return [(n, dict([(u'attr-{0}'.format(i), n * i) for i in range(0, entries)]),
+             dict([(u'flag-{0}'.format(i), (n + i) % 2 == 0) for i in range(0, entries // 10)]),
+             (n * 0.001, -n * 0.002, u'zone {0}'.format(n % 10)))
+            for n in range(0, count)]
+
+
+def setup_tables(scale):
+    partitions = int(1000 * scale)
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('events', EVENTS_SCHEMA, ['id'], ['ts'], make_events(partitions, 50)))
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('times', TIMES_SCHEMA, ['id'], [], make_times(int(20000 * scale))))
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('counters', COUNTERS_SCHEMA, ['page'], ['day'], []))
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('attributes', ATTRIBUTES_SCHEMA, ['id'], [], make_attributes(int(2000 * scale), 200)))
+    return partitions
+
+
+def make_provider(table, schema, **options):
+    options.update({'hosts': 'bench', 'keyspace': KEYSPACE, 'columnfamily': table})
+    columns = OrderedDict([(c, None) for c, t in schema] + [(ROWID_COLUMN, None)])
+    return CassandraProvider(options, columns)
+
+
+def consume(rows):
+    count = 0
+    for row in rows:
+        count += 1
+    return count
+
+
+def partition_lookup(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA)
+    columns = ['id', 'ts', 'amount', 'label']
+    lookups = int(2000 * scale)
+    for n in range(0, lookups):
+        consume(provider.execute([Qual('id', '=', 'device-{0}'.format(n % partitions))], columns))
+    return lookups
+
+
+def wide_scan(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA, fetch_size='5000')
+    return consume(provider.execute([], [c for c, t in EVENTS_SCHEMA]))
+
+
+def rowid_scan(scale, partitions):
+    # What UPDATE and DELETE read before modifying rows
+    provider = make_provider('events', EVENTS_SCHEMA, fetch_size='5000')
+    return consume(provider.execute([], ['amount', ROWID_COLUMN]))
+
+
+def filtered_scan(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA, fetch_size='5000')
+    return consume(provider.execute([Qual('seq', '>', 45)], ['id', 'ts', 'seq']))
+
+
+def in_fanout(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA, in_fanout='True')
+    queries = int(100 * scale)
+    for n in range(0, queries):
+        keys = ['device-{0}'.format((n + i) % partitions) for i in range(0, 20)]
+        consume(provider.execute([Qual('id', (u'=', True), keys)], ['id', 'ts', 'amount'], [SortKey('ts')]))
+    return queries
+
+
+def insert_items(count):
+    start = datetime(2018, 1, 1)
+    return [('insert', {'id': u'new-{0}'.format(n % 500), 'ts': (start + timedelta(seconds=n)).strftime('%Y-%m-%d %H:%M:%S+00'),
+                        'seq': n, 'kind': u'k', 'amount': n * 0.5, 'count': n, 'label': u'inserted', 'attrs': '{"a": 1}'})
+            for n in range(0, count)]
+
+
+def bulk_insert(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA)
+    items = insert_items(int(10000 * scale))
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+def bulk_insert_batched(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA, modify_mode='unlogged_batch')
+    items = insert_items(int(10000 * scale))
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+def sparse_items(count):
+    # Only the primary key and one of the other columns are set
+    start = datetime(2018, 1, 1)
+    items = []
+    for n in range(0, count):
+        new_values = {'id': u'sparse-{0}'.format(n % 500), 'ts': start + timedelta(seconds=n), 'seq': None, 'kind': None,
+                      'amount': None, 'count': None, 'label': None, 'attrs': None}
+        new_values[('kind', 'amount', 'label')[n % 3]] = (u'k', 1.5, u'l')[n % 3]
+        items.append(('insert', new_values))
+    return items
+
+
+def sparse_insert(scale, partitions, mode='bind'):
+    provider = make_provider('events', EVENTS_SCHEMA, null_insert_mode=mode)
+    items = sparse_items(int(10000 * scale))
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+def sparse_insert_unset(scale, partitions):
+    return sparse_insert(scale, partitions, 'unset')
+
+
+def sparse_insert_omit(scale, partitions):
+    return sparse_insert(scale, partitions, 'omit')
+
+
+def bulk_delete(scale, partitions):
+    provider = make_provider('events', EVENTS_SCHEMA)
+    rowids = [row[-1] for row in provider.execute([Qual('id', '=', 'device-1')], ['id', 'ts', ROWID_COLUMN])]
+    items = [('delete', rowids[n % len(rowids)]) for n in range(0, int(10000 * scale))]
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+def bulk_update(scale, partitions):
+    # UPDATE ... SET label = ... over a scan: one column written per row
+    provider = make_provider('events', EVENTS_SCHEMA, fetch_size='5000')
+    names = [c for c, t in EVENTS_SCHEMA] + [ROWID_COLUMN]
+    table_columns = provider.table_columns
+    items = []
+    for row in itertools.islice(provider.execute([], names), int(10000 * scale)):
+        new_values = dict([(c, row[table_columns.index(c)]) for c, t in EVENTS_SCHEMA])
+        new_values['label'] = u'updated'
+        items.extend(provider.get_update_items(row[table_columns.index(ROWID_COLUMN)], new_values))
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+def counter_aggregate(scale, partitions):
+    # INSERT INTO counters SELECT ... over 100 events per counter row
+    provider = make_provider('counters', COUNTERS_SCHEMA)
+    events = int(10000 * scale)
+    items = [provider.get_increment_item({'page': u'/page/{0}'.format(n % (events // 100)), 'day': 1, 'hits': 1, 'bytes': n})
+             for n in range(0, events)]
+    provider.execute_modify_items(items, 4)
+    return events
+
+
+def timestamp_scan(scale, partitions):
+    provider = make_provider('times', TIMES_SCHEMA, fetch_size='5000')
+    return consume(provider.execute([], [c for c, t in TIMES_SCHEMA]))
+
+
+def map_scan(scale, partitions):
+    provider = make_provider('attributes', ATTRIBUTES_SCHEMA, fetch_size='5000')
+    return consume(provider.execute([], [c for c, t in ATTRIBUTES_SCHEMA]))
+
+
+def timestamp_insert(scale, partitions):
+    provider = make_provider('times', TIMES_SCHEMA)
+    start = datetime(2017, 1, 1)
+    items = []
+    for n in range(0, int(10000 * scale)):
+        value = (start + timedelta(seconds=n)).strftime('%Y-%m-%d %H:%M:%S.%f+00')
+        items.append(('insert', {'id': n, 'created': value, 'updated': value, 'seen': value, 'started': value,
+                                 'ended': value, 'at': '12:30:15.5+00'}))
+    provider.execute_modify_items(items, 4)
+    return len(items)
+
+
+WORKLOADS = OrderedDict([
+    ('partition_lookup', (partition_lookup, 'queries')),
+    ('wide_scan', (wide_scan, 'rows')),
+    ('rowid_scan', (rowid_scan, 'rows')),
+    ('filtered_scan', (filtered_scan, 'rows')),
+    ('in_fanout', (in_fanout, 'queries')),
+    ('bulk_insert', (bulk_insert, 'rows')),
+    ('bulk_insert_batched', (bulk_insert_batched, 'rows')),
+    ('sparse_insert', (sparse_insert, 'rows')),
+    ('sparse_insert_unset', (sparse_insert_unset, 'rows')),
+    ('sparse_insert_omit', (sparse_insert_omit, 'rows')),
+    ('bulk_delete', (bulk_delete, 'rows')),
+    ('bulk_update', (bulk_update, 'rows')),
+    ('counter_aggregate', (counter_aggregate, 'events')),
+    ('timestamp_scan', (timestamp_scan, 'rows')),
+    ('timestamp_insert', (timestamp_insert, 'rows')),
+    ('map_scan', (map_scan, 'rows'))
+])
+
+
+def run_workload(fn, scale, partitions, repeat):
+    # Python 2 has no tracemalloc: allocations are reported as the gc-tracked
+    # objects still alive after the run and the peak RSS of the process
+    best = None
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    for i in range(0, repeat):
+        start = time.time()
+        ops = fn(scale, partitions)
+        elapsed = time.time() - start
+        if best is None or ops / elapsed > best:
+            best = ops / elapsed
+    gc.collect()
+    return {
+        'ops_per_sec': best,
+        'retained_objects': len(gc.get_objects()) - objects_before,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def check_regressions(results, baseline, threshold):
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]['ops_per_sec']
+        if result['ops_per_sec'] < expected * (1 - threshold):
+            failures.append(u"{0}: {1:.0f} ops/sec, baseline {2:.0f}".format(name, result['ops_per_sec'], expected))
+    return failures
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--quick', action='store_true', default=False, help='smaller data sets, single run')
+    parser.add_option('--only', default=None, help='comma separated workloads to run')
+    parser.add_option('--save', default=None, help='write the results to this JSON file')
+    parser.add_option('--baseline', default=None, help='compare against a JSON file written by --save')
+    parser.add_option('--threshold', type='float', default=0.25, help='allowed slowdown against the baseline')
+    options, args = parser.parse_args()
+    scale = 0.2 if options.quick else 1.0
+    repeat = 1 if options.quick else 3
+    names = WORKLOADS.keys()
+    if options.only:
+        names = [n.strip() for n in options.only.split(',')]
+    partitions = setup_tables(scale)
+    results = OrderedDict()
+    for name in names:
+        fn, unit = WORKLOADS[name]
+        result = run_workload(fn, scale, partitions, repeat)
+        result['unit'] = unit
+        results[name] = result
+        print("{0:<20} {1:>12.0f} {2}/sec {3:>10} retained objects {4:>8} KB max RSS".format(
+            name, result['ops_per_sec'], unit, result['retained_objects'], result['max_rss_kb']))
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            failures = check_regressions(results, json.load(f), options.threshold)
+        if failures:
+            print("regressions above {0:.0%}:".format(options.threshold))
+            for failure in failures:
+                print("  " + failure)
+            sys.exit(1)
+        print("no regression above {0:.0%}".format(options.threshold))
+
+
+if __name__ == '__main__':
+    main()
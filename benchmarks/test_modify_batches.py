@@ -0,0 +1,45 @@
+# Batches must stay under Cassandra's batch_size_fail_threshold_in_kb.
+#
+#   python benchmarks/test_modify_batches.py
+import unittest
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+import modify_batches
+
+
+class Bound(object):
+    # Values serialized the way the driver binds them
+
+    def __init__(self, routing_key, size):
+        self.routing_key = routing_key
+        self.values = [b'k', b'x' * size, None]
+
+
+def batch_sizes(batches):
+    return [len(batch.statements) if isinstance(batch, fake_cassandra.BatchStatement) else 1 for batch, params in batches]
+
+
+class GroupUnloggedBatchesTest(unittest.TestCase):
+
+    def test_count_limit(self):
+        bounds = [(Bound('a', 10), None) for n in range(0, 25)]
+        self.assertEqual(batch_sizes(modify_batches.group_unlogged_batches(bounds, 10, batch_max_bytes=40000)), [10, 10, 5])
+
+    def test_bytes_limit(self):
+        bounds = [(Bound('a', 9999), None) for n in range(0, 10)]
+        self.assertEqual(batch_sizes(modify_batches.group_unlogged_batches(bounds, 100, batch_max_bytes=40000)), [4, 4, 2])
+
+    def test_large_statement_alone(self):
+        bounds = [(Bound('a', 10), None), (Bound('a', 60000), None), (Bound('a', 10), None)]
+        self.assertEqual(batch_sizes(modify_batches.group_unlogged_batches(bounds, 100, batch_max_bytes=40000)), [1, 1, 1])
+
+    def test_partitions_apart(self):
+        bounds = [(Bound(key, 10), None) for key in ['a', 'b', 'a', 'b', 'a']]
+        self.assertEqual(batch_sizes(modify_batches.group_unlogged_batches(bounds, 100, batch_max_bytes=40000)), [3, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
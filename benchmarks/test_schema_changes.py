@@ -0,0 +1,49 @@
+# Long-lived providers notice schema changes without driver schema events.
+#
+#   python benchmarks/test_schema_changes.py
+import unittest
+from collections import OrderedDict
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+from fake_cassandra import Qual
+from cassandra_provider import CassandraProvider
+
+KEYSPACE = 'changes'
+SCHEMA = [('id', 'int'), ('seq', 'int'), ('label', 'text')]
+ALTERED_SCHEMA = SCHEMA + [('note', 'text')]
+
+
+class SchemaChangeTest(unittest.TestCase):
+
+    def setUp(self):
+        fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('rows', SCHEMA, ['id'], ['seq'], [(1, 1, u'a')]))
+        options = {'hosts': 'changes', 'keyspace': KEYSPACE, 'columnfamily': 'rows', 'schema_check_interval': '0'}
+        self.provider = CassandraProvider(options, OrderedDict([(c, None) for c, t in ALTERED_SCHEMA]))
+
+    def tearDown(self):
+        fake_cassandra.SCHEMA_VERSION[0] = 'initial'
+
+    def select(self):
+        return list(self.provider.execute([Qual('id', '=', 1)], ['seq', 'label']))
+
+    def test_altered_table_is_described_again(self):
+        self.select()
+        statements = self.provider.connection.statements
+        misses = statements.misses
+        self.provider.check_schema()
+        self.select()
+        self.assertEqual(statements.misses, misses)
+        self.assertNotIn('note', self.provider.columnsTypes)
+        fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('rows', ALTERED_SCHEMA, ['id'], ['seq'], [(1, 1, u'a', u'n')]))
+        fake_cassandra.SCHEMA_VERSION[0] = 'altered'
+        self.provider.check_schema()
+        self.assertIn('note', self.provider.columnsTypes)
+        self.select()
+        self.assertEqual(statements.misses, misses + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# Rows filtered out of a snapshot, or by the residual checks of a scan, never
+# reach PostgreSQL's recheck, the FDW may only drop those PostgreSQL would drop too.
+#
+#   python benchmarks/test_snapshot_filters.py
+import unittest
+from collections import OrderedDict
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+from fake_cassandra import Qual
+from cassandra_provider import CassandraProvider
+
+KEYSPACE = 'filters'
+SCHEMA = [('id', 'int'), ('seq', 'int'), ('label', 'text'), ('amount', 'double')]
+LABELS = [u'apple', u'Banana', u'banana', u'Cherry', u'_under', u'\xe9clair', u'Zebra', u'zebra']
+ROWS = [(0, n, LABELS[n], float('nan') if n % 3 == 0 else float(n)) for n in range(0, len(LABELS))]
+
+
+def make_provider(snapshot='True'):
+    options = {'hosts': 'filters', 'keyspace': KEYSPACE, 'columnfamily': 'labels', 'snapshot': snapshot}
+    return CassandraProvider(options, OrderedDict([(c, None) for c, t in SCHEMA]))
+
+
+def select(provider, quals):
+    # Rows come back in table column order
+    return sorted([(row[1], row[2]) for row in provider.execute(quals, [c for c, t in SCHEMA])])
+
+
+class SnapshotFiltersTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('labels', SCHEMA, ['id'], ['seq'], ROWS))
+
+    def setUp(self):
+        self.provider = make_provider()
+        self.all_rows = select(self.provider, [])
+
+    def test_text_range_keeps_every_row(self):
+        # Collations don't order text by code points, 'Banana' > 'apple' in en_US
+        for operator in ('<', '<=', '>', '>='):
+            self.assertEqual(select(self.provider, [Qual('label', operator, u'banana')]), self.all_rows)
+
+    def test_text_equality_filters(self):
+        self.assertEqual(select(self.provider, [Qual('label', '=', u'Banana')]), [(1, u'Banana')])
+        self.assertEqual(select(self.provider, [Qual('label', (u'=', True), [u'zebra', u'apple'])]), [(0, u'apple'), (7, u'zebra')])
+
+    def test_double_keeps_every_row(self):
+        # NaN is equal to itself and greater than any number in PostgreSQL
+        for operator in ('=', '<>', '<', '>'):
+            self.assertEqual(select(self.provider, [Qual('amount', operator, float('nan'))]), self.all_rows)
+            self.assertEqual(select(self.provider, [Qual('amount', operator, 2.0)]), self.all_rows)
+
+
+
+class ResidualFiltersTest(SnapshotFiltersTest):
+
+    def setUp(self):
+        # label and amount are regular columns, Cassandra can't filter them
+        self.provider = make_provider(snapshot='False')
+        self.all_rows = select(self.provider, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
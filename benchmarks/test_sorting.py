@@ -0,0 +1,58 @@
+# Sorts the FDW accepts must not buffer a whole table scan in memory.
+#
+#   python benchmarks/test_sorting.py
+import random
+import unittest
+from collections import OrderedDict
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+from fake_cassandra import Qual, SortKey
+from cassandra_provider import CassandraProvider
+import query_plan
+
+KEYSPACE = 'sorting'
+SCHEMA = [('id', 'int'), ('seq', 'int'), ('label', 'text')]
+
+
+class CanSortTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('events', SCHEMA, ['id'], ['seq'], []))
+
+    def setUp(self):
+        options = {'hosts': 'sorting', 'keyspace': KEYSPACE, 'columnfamily': 'events'}
+        self.provider = CassandraProvider(options, OrderedDict([(c, None) for c, t in SCHEMA]))
+
+    def test_unrestricted_partition_is_not_sorted(self):
+        self.provider.get_rel_size([Qual('seq', '>', 10)], ['id', 'seq'])
+        self.assertEqual(self.provider.can_sort([SortKey('seq')]), [])
+
+    def test_restricted_partition_is_sorted(self):
+        for qual in (Qual('id', '=', 1), Qual('id', (u'=', True), [1, 2])):
+            self.provider.get_rel_size([qual], ['id', 'seq'])
+            self.assertEqual([k.attname for k in self.provider.can_sort([SortKey('seq')])], ['seq'])
+
+    def test_scans_of_one_table_share_the_restriction(self):
+        # A self-join sizes both relations before any path is built
+        self.provider.get_rel_size([Qual('id', '=', 1)], ['id', 'seq'])
+        self.provider.get_rel_size([], ['id', 'seq'])
+        self.assertEqual(self.provider.can_sort([SortKey('seq')]), [])
+        list(self.provider.execute([Qual('id', '=', 1)], ['id', 'seq']))
+        self.provider.get_rel_size([Qual('id', '=', 1)], ['id', 'seq'])
+        self.assertEqual([k.attname for k in self.provider.can_sort([SortKey('seq')])], ['seq'])
+
+
+class SortRowsTest(unittest.TestCase):
+
+    def test_limit_keeps_first_rows(self):
+        rows = [(random.randint(0, 20), random.randint(0, 20), n) for n in range(0, 500)]
+        client_sort = [(0, False), (1, True)]
+        self.assertEqual(query_plan.sort_rows(iter(rows), client_sort, 37), query_plan.sort_rows(rows, client_sort)[:37])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# The shared descriptor cache is only trusted when the server user wrote it.
+#
+#   python benchmarks/test_table_descriptors.py
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+import shared_files
+import table_descriptors
+
+
+class Connection(object):
+    key = (('bench',), '9042')
+
+
+class DescriptorCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved_directory = shared_files.DIRECTORY
+        shared_files.DIRECTORY = os.path.join(self.directory, 'shared')
+        table_descriptors._descriptors.clear()
+        table_descriptors._files.clear()
+        self.built = []
+
+    def tearDown(self):
+        shared_files.DIRECTORY = self.saved_directory
+        shutil.rmtree(self.directory)
+
+    def build(self):
+        self.built.append(1)
+        return table_descriptors.TableDescriptor(['id'], {'id': 'int'}, {'id': 1},
+                                                 {'id': 0}, {}, ['id'], ['id'], [], {})
+
+    def get_descriptor(self):
+        table_descriptors._descriptors.clear()
+        table_descriptors._files.clear()
+        return table_descriptors.get_descriptor(Connection(), 'ks', 'table', 'v1', True, self.build)
+
+    def test_shared_file(self):
+        self.get_descriptor()
+        path = os.path.join(shared_files.DIRECTORY, table_descriptors.CACHE_FILE_NAME)
+        self.assertEqual(json.load(open(path)).keys(), [u'bench:9042/ks.table'])
+        self.get_descriptor()
+        self.assertEqual(len(self.built), 1)
+
+    def test_writable_file_is_ignored(self):
+        self.get_descriptor()
+        os.chmod(os.path.join(shared_files.DIRECTORY, table_descriptors.CACHE_FILE_NAME), 0666)
+        self.get_descriptor()
+        self.assertEqual(len(self.built), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# Snapshot files are unpickled, only the server user may have written them,
+# and no table option chooses where they are written or removed.
+#
+#   python benchmarks/test_table_snapshot.py
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+import shared_files
+import table_snapshot
+
+COLUMNS = ('id', 'seq', 'label')
+ROWS = [(1, 1, u'a'), (1, 2, u'b'), (2, 1, u'c')]
+KEY = (('hosts',), 'ks', 'table')
+
+
+class SnapshotFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved_directory = shared_files.DIRECTORY
+        shared_files.DIRECTORY = os.path.join(self.directory, 'shared')
+        self.path = table_snapshot.get_file_path(KEY)
+        table_snapshot.write_snapshot_file(self.path, table_snapshot.TableSnapshot(COLUMNS, 1, ROWS, 0))
+
+    def tearDown(self):
+        shared_files.DIRECTORY = self.saved_directory
+        shutil.rmtree(self.directory)
+
+    def test_private_file(self):
+        self.assertEqual(os.path.dirname(self.path), shared_files.DIRECTORY)
+        self.assertEqual(stat.S_IMODE(os.stat(shared_files.DIRECTORY).st_mode), 0700)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0600)
+        snapshot = table_snapshot.read_snapshot_file(self.path, COLUMNS, 0)
+        self.assertEqual(snapshot.get_partition((1,)), ROWS[:2])
+
+    def test_writable_file_is_ignored(self):
+        os.chmod(self.path, 0666)
+        self.assertIsNone(table_snapshot.read_snapshot_file(self.path, COLUMNS, 0))
+
+    def test_writable_directory_is_not_used(self):
+        os.chmod(shared_files.DIRECTORY, 0777)
+        self.assertIsNone(table_snapshot.get_file_path(KEY))
+        table_snapshot.invalidate(KEY, True)
+        self.assertTrue(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# UPDATE writes the changed columns of a row and never moves it to another key.
+#
+#   python benchmarks/test_updates.py
+import unittest
+from collections import OrderedDict
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+from fake_cassandra import Qual
+from cassandra_provider import CassandraProvider
+import properties
+
+KEYSPACE = 'updates'
+SCHEMA = [('id', 'int'), ('seq', 'int'), ('label', 'text')]
+COUNTERS_SCHEMA = [('page', 'text'), ('day', 'int'), ('hits', 'counter')]
+ROWID_COLUMN = CassandraProvider.ROWIDCOLUMN
+
+
+def setUpModule():
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('rows', SCHEMA, ['id'], ['seq'], [(1, 1, u'a'), (1, 2, u'b')]))
+    fake_cassandra.add_table(KEYSPACE, fake_cassandra.Table('counters', COUNTERS_SCHEMA, ['page'], ['day'], [(u'home', 1, 5), (u'home', 2, 7)]))
+
+
+class UpdateItemsTest(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hosts': 'updates', 'keyspace': KEYSPACE, 'columnfamily': 'rows'}
+        self.provider = CassandraProvider(options, OrderedDict([(c, None) for c, t in SCHEMA] + [(ROWID_COLUMN, None)]))
+        # Rows come back in table column order, the rowid last
+        self.rows = list(self.provider.execute([Qual('id', '=', 1)], ['seq', 'label', ROWID_COLUMN]))
+
+    def test_changed_columns(self):
+        row = self.rows[0]
+        items = self.provider.get_update_items(row[3], {'id': 1, 'seq': 1, 'label': u'c'})
+        self.assertEqual([(kind, value[0]) for kind, value in items], [('update', ('label',))])
+
+    def test_primary_key_change(self):
+        row = self.rows[0]
+        self.assertRaises(Exception, self.provider.get_update_items, row[3], {'id': 1, 'seq': 2, 'label': u'a'})
+
+    def test_evicted_row_is_read_again(self):
+        self.provider.recent_rows.clear()
+        row = self.rows[0]
+        items = self.provider.get_update_items(row[3], {'id': 1, 'seq': 1, 'label': u'a'})
+        self.assertEqual(items, [])
+
+
+class CounterUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        options = {'hosts': 'updates', 'keyspace': KEYSPACE, 'columnfamily': 'counters'}
+        self.provider = CassandraProvider(options, OrderedDict([(c, None) for c, t in COUNTERS_SCHEMA] + [(ROWID_COLUMN, None)]))
+        self.saved_size = properties.RECENT_ROWS_CACHE_SIZE
+        properties.RECENT_ROWS_CACHE_SIZE = 1
+
+    def tearDown(self):
+        properties.RECENT_ROWS_CACHE_SIZE = self.saved_size
+
+    def test_scan_larger_than_recent_rows(self):
+        # The whole table is read before the first update, like the inner side of UPDATE ... FROM
+        rows = list(self.provider.execute([], ['hits', ROWID_COLUMN]))
+        self.assertEqual(len(self.provider.recent_rows), 1)
+        deltas = [self.provider.get_update_items(row[3], {'page': row[0], 'day': row[1], 'hits': row[2] + 1})[0][1][1] for row in rows]
+        self.assertEqual(deltas, [[1], [1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
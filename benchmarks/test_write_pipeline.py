@@ -0,0 +1,63 @@
+# Pipelined writes of an aborted statement must not fail the next one.
+#
+#   python benchmarks/test_write_pipeline.py
+import threading
+import unittest
+
+import fake_cassandra
+
+fake_cassandra.install()
+
+import write_pipeline
+
+
+class LateFuture(object):
+    # Completes from another thread once released, like a driver future
+
+    def __init__(self, release, error):
+        self.release = release
+        self.error = error
+
+    def add_callbacks(self, callback, errback):
+        def complete():
+            self.release.wait()
+            if self.error is None:
+                callback([])
+            else:
+                errback(self.error)
+        threading.Thread(target=complete).start()
+
+
+class FailingSession(object):
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def execute_async(self, statement, params):
+        return LateFuture(self.release, None if statement == 'ok' else Exception('write failed'))
+
+
+class WritePipelineTest(unittest.TestCase):
+
+    def test_reset_discards_pending_errors(self):
+        session = FailingSession()
+        pipeline = write_pipeline.WritePipeline(session, 4)
+        pipeline.submit('fail', None)
+        pipeline.submit('fail', None)
+        threading.Timer(0.05, session.release.set).start()
+        pipeline.reset()
+        self.assertEqual(pipeline.in_flight, 0)
+        pipeline.submit('ok', None)
+        pipeline.drain()
+
+    def test_drain_raises(self):
+        session = FailingSession()
+        session.release.set()
+        pipeline = write_pipeline.WritePipeline(session, 4)
+        pipeline.submit('fail', None)
+        self.assertRaises(Exception, pipeline.drain)
+        pipeline.drain()
+
+
+if __name__ == '__main__':
+    unittest.main()
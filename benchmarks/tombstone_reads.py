@@ -0,0 +1,114 @@
+# Read latency after a sparse load, once per null_insert_mode. Tombstones only
+# exist in a real cluster, so unlike run_benchmarks.py this needs one:
+#
+#   python benchmarks/tombstone_reads.py --hosts 127.0.0.1 [--port 9042]
+#                                        [--rows 200000] [--partitions 200] [--reads 200]
+#
+# Each mode loads the same rows into its own table of the fdw_bench keyspace,
+# then reads whole partitions through the FDW. Tombstones are counted from the
+# query trace of one read. Run `nodetool flush fdw_bench` before the reads if
+# they should come from sstables instead of memtables (--pause waits for it).
+import optparse
+import re
+import time
+
+import fake_cassandra
+
+fake_cassandra.install_multicorn()
+
+from cassandra.cluster import Cluster
+from cassandra.query import SimpleStatement
+from fake_cassandra import Qual
+from cassandra_provider import CassandraProvider
+
+KEYSPACE = 'fdw_bench'
+SPARSE_COLUMNS = ['c{0}'.format(i) for i in range(0, 20)]
+COLUMNS = ['id', 'seq'] + SPARSE_COLUMNS
+MODES = ['bind', 'unset', 'omit']
+TRACE_RE = re.compile(r'Read (\d+) live rows and (\d+) tombstone cells')
+
+
+def create_table(session, table):
+    session.execute("CREATE KEYSPACE IF NOT EXISTS {0} WITH replication = {{'class': 'SimpleStrategy', 'replication_factor': 1}}".format(KEYSPACE))
+    session.execute("DROP TABLE IF EXISTS {0}.{1}".format(KEYSPACE, table))
+    session.execute("CREATE TABLE {0}.{1} (id int, seq int, {2}, PRIMARY KEY (id, seq))".format(
+        KEYSPACE, table, ", ".join([c + " text" for c in SPARSE_COLUMNS])))
+
+
+def sparse_rows(count, partitions):
+    # Two columns out of twenty are set, the others are NULL
+    for n in range(0, count):
+        row = {'id': n % partitions, 'seq': n}
+        for i in range(0, len(SPARSE_COLUMNS)):
+            row[SPARSE_COLUMNS[i]] = u'value {0}'.format(n) if (n + i) % 10 == 0 else None
+        yield row
+
+
+def make_provider(options, table, mode):
+    options = dict(options, keyspace=KEYSPACE, columnfamily=table, null_insert_mode=mode, fetch_size='1000')
+    return CassandraProvider(options, dict([(c, None) for c in COLUMNS]))
+
+
+def load(provider, rows):
+    items = []
+    for row in rows:
+        items.append(('insert', row))
+        if len(items) >= 5000:
+            provider.execute_modify_items(items, 32)
+            items = []
+    provider.execute_modify_items(items, 32)
+
+
+def read_latencies(provider, partitions, reads):
+    latencies = []
+    for n in range(0, reads):
+        st = time.time()
+        for row in provider.execute([Qual('id', '=', n % partitions)], COLUMNS):
+            pass
+        latencies.append(time.time() - st)
+    latencies.sort()
+    return latencies
+
+
+def count_tombstones(session, table):
+    result = session.execute(SimpleStatement("SELECT * FROM {0}.{1} WHERE id = 0".format(KEYSPACE, table)), trace=True)
+    tombstones = 0
+    for event in result.get_query_trace().events:
+        match = TRACE_RE.search(event.description)
+        if match is not None:
+            tombstones += int(match.group(2))
+    return tombstones
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--hosts', default='127.0.0.1')
+    parser.add_option('--port', default='9042')
+    parser.add_option('--rows', type='int', default=200000)
+    parser.add_option('--partitions', type='int', default=200)
+    parser.add_option('--reads', type='int', default=200)
+    parser.add_option('--pause', action='store_true', default=False, help='wait for enter between the load and the reads')
+    options, args = parser.parse_args()
+    fdw_options = {'hosts': options.hosts, 'port': options.port}
+    cluster = Cluster(options.hosts.split(','), port=int(options.port))
+    session = cluster.connect()
+    providers = {}
+    for mode in MODES:
+        table = 'sparse_' + mode
+        create_table(session, table)
+        providers[mode] = make_provider(fdw_options, table, mode)
+        st = time.time()
+        load(providers[mode], sparse_rows(options.rows, options.partitions))
+        print("{0:<6} loaded {1} rows in {2:.1f} s".format(mode, options.rows, time.time() - st))
+    if options.pause:
+        raw_input("flush now if needed, then press enter")
+    for mode in MODES:
+        latencies = read_latencies(providers[mode], options.partitions, options.reads)
+        print("{0:<6} partition read p50 {1:.1f} ms p95 {2:.1f} ms, {3} tombstones read in partition 0".format(
+            mode, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000,
+            count_tombstones(session, 'sparse_' + mode)))
+    cluster.shutdown()
+
+
+if __name__ == '__main__':
+    main()
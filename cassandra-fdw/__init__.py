@@ -3,6 +3,8 @@ from cassandra_provider import CassandraProvider
 from properties import ISDEBUG
 import properties
 import schema_importer
+import metrics
+import logger
 import time
 
 class CassandraFDW(ForeignDataWrapper):
@@ -15,8 +17,12 @@ class CassandraFDW(ForeignDataWrapper):
         self.concurency_level = int(options.get('modify_concurency', properties.DEFAULT_CONCURENCY_LEVEL))
         self.per_transaction_connection = options.get('per_transaction_connection', properties.PER_TRANSACTION_CONNECTION) == 'True'
         self.modify_items = []
+        # A stats table shows the metrics of the backend, it has no Cassandra table behind it
+        self.stats_table = options.get('stats_table', properties.STATS_TABLE_DEFAULT) == 'True'
 
     def build_cassandra_provider(self):
+        if self.stats_table:
+            return
         if self.cassandra_provider == None:
             self.cassandra_provider = CassandraProvider(self.init_options, self.init_columns)
 
@@ -25,19 +31,30 @@ class CassandraFDW(ForeignDataWrapper):
         return schema_importer.import_schema(schema, srv_options, options, restriction_type, restricts)
 
     def insert(self, new_values):
+        if self.stats_table:
+            logger.log("Stats tables are read only, use DELETE to reset metrics.", logger.ERROR)
+        if len(self.cassandra_provider.counterColumns) > 0:
+            # Increments are always buffered, to be summed per row
+            self.add_modify_item(self.cassandra_provider.get_increment_item(new_values))
+            return new_values
+        if self.cassandra_provider.modify_mode == 'pipeline':
+            self.cassandra_provider.submit_modify_item(('insert', new_values))
+            return new_values
         if self.concurency_level > 1:
-            self.modify_items.append(('insert', new_values))
-            if len(self.modify_items) >= properties.BATCH_MODIFY_THRESHOLD:
-                self.end_modify()
+            self.add_modify_item(('insert', new_values))
             return new_values
         else:
             return self.cassandra_provider.insert(new_values)
 
     def delete(self, rowid):
+        if self.stats_table:
+            metrics.reset(rowid)
+            return { }
+        if self.cassandra_provider.modify_mode == 'pipeline':
+            self.cassandra_provider.submit_modify_item(('delete', rowid))
+            return { }
         if self.concurency_level > 1:
-            self.modify_items.append(('delete', rowid))
-            if len(self.modify_items) >= properties.BATCH_MODIFY_THRESHOLD:
-                self.end_modify()
+            self.add_modify_item(('delete', rowid))
             return { }
         else:
             return self.cassandra_provider.delete(rowid)
@@ -45,20 +62,55 @@ class CassandraFDW(ForeignDataWrapper):
     def update(self, rowid, new_values):
         if ISDEBUG:
             logger.log(u"requested update {0}".format(new_values))
-        self.insert(new_values)
+        if self.stats_table:
+            logger.log("Stats tables are read only, use DELETE to reset metrics.", logger.ERROR)
+        items = self.cassandra_provider.get_update_items(rowid, new_values)
+        if len(self.cassandra_provider.counterColumns) > 0:
+            for item in items:
+                self.add_modify_item(item)
+        elif self.cassandra_provider.modify_mode == 'pipeline':
+            for item in items:
+                self.cassandra_provider.submit_modify_item(item)
+        elif self.concurency_level > 1:
+            for item in items:
+                self.add_modify_item(item)
+        elif len(items) > 0:
+            self.cassandra_provider.execute_modify_items(items, 1)
         return new_values
 
-    def execute(self, quals, columns, sort_keys=None):
+    def add_modify_item(self, item):
+        self.modify_items.append(item)
+        if len(self.modify_items) >= properties.BATCH_MODIFY_THRESHOLD:
+            self.end_modify()
+
+    def execute(self, quals, columns, sort_keys=None, limit=None, offset=None):
         self.scan_start_time = time.time()
-        return self.cassandra_provider.execute(quals, columns, sort_keys)
+        if self.stats_table:
+            return metrics.get_rows(CassandraProvider.ROWIDCOLUMN)
+        return self.cassandra_provider.execute(quals, columns, sort_keys, limit, offset)
 
     def can_sort(self, sort_keys):
-        return []
+        if self.stats_table:
+            return []
+        self.build_cassandra_provider()
+        return self.cassandra_provider.can_sort(sort_keys)
+
+    def can_limit(self, limit, offset):
+        return not self.stats_table
 
     def begin(self, serializable):
         self.build_cassandra_provider()
         if ISDEBUG:
             logger.log("begin: {0}".format(serializable))
+        self.discard_modifications()
+        if self.cassandra_provider != None:
+            self.cassandra_provider.check_schema()
+
+    def discard_modifications(self):
+        # Left over by a statement that failed before end_modify
+        self.modify_items = []
+        if self.cassandra_provider != None:
+            self.cassandra_provider.reset_write_pipeline()
 
     def commit(self):
         if ISDEBUG:
@@ -73,6 +125,8 @@ class CassandraFDW(ForeignDataWrapper):
             self.cassandra_provider = None
 
     def end_modify(self):
+        if self.stats_table:
+            return
         try:
             mod_len = len(self.modify_items)
             if mod_len > 0:
@@ -80,12 +134,15 @@ class CassandraFDW(ForeignDataWrapper):
                     logger.log("end modify")
                     logger.log("modify concurrency level: {0}".format(self.concurency_level))
                 self.cassandra_provider.execute_modify_items(self.modify_items, self.concurency_level)
+            self.cassandra_provider.drain_write_pipeline()
         finally:
             self.modify_items = []
             pass
 
     def explain(self, quals, columns, sortkeys=None, verbose=False):
-        return self.cassandra_provider.build_select_stmt(quals, columns, self.cassandra_provider.allow_filtering, verbose)
+        if self.stats_table:
+            return [u"cassandra-fdw metrics"]
+        return self.cassandra_provider.build_select_stmt(quals, columns, self.cassandra_provider.allow_filtering, verbose, sortkeys)
 
     def end_scan(self):
         if ISDEBUG:
@@ -100,7 +157,7 @@ class CassandraFDW(ForeignDataWrapper):
     def rollback(self):
         if ISDEBUG:
             logger.log("rollback")
-        pass
+        self.discard_modifications()
 
     def sub_begin(self, level):
         if ISDEBUG:
@@ -115,15 +172,21 @@ class CassandraFDW(ForeignDataWrapper):
     def sub_rollback(self, level):
         if ISDEBUG:
             logger.log("sub rollback {0}".format(level))
-        pass
+        self.discard_modifications()
 
     @property
     def rowid_column(self):
+        if self.stats_table:
+            return CassandraProvider.ROWIDCOLUMN
         return self.cassandra_provider.get_row_id_column()
 
     def get_rel_size(self, quals, columns):
+        if self.stats_table:
+            return (100, 100)
         return self.cassandra_provider.get_rel_size(quals, columns)
 
     def get_path_keys(self):
         self.scan_start_time = time.time()
+        if self.stats_table:
+            return []
         return self.cassandra_provider.get_path_keys()
\ No newline at end of file
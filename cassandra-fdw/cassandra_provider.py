@@ -1,19 +1,29 @@
-from cassandra.util import OrderedMapSerializedKey
 from cassandra import ConsistencyLevel
 from cassandra.metadata import Metadata
-from cassandra.cluster import Cluster
-from cassandra.query import SimpleStatement, ValueSequence
-from collections import defaultdict
-from cassandra.auth import PlainTextAuthProvider
+from cassandra.query import SimpleStatement, UNSET_VALUE
+from collections import defaultdict, OrderedDict
 from datetime import datetime, date, time, timedelta
 from cStringIO import StringIO
 import time
 import math
-import json
 import types_mapper
 import cassandra_types
+import connection_pool
+import result_pager
+import row_decoders
+import rowid_codec
+import query_plan
+import table_stats
+import modify_batches
+import write_pipeline
+import token_ranges
+import table_snapshot
+import table_descriptors
+import predicates
+import metrics
 import logger
 import operator
+import itertools
 import properties
 from logger import ERROR, WARNING, INFO, DEBUG
 from properties import ISDEBUG
@@ -35,14 +45,40 @@ class CassandraProvider:
         self.columnfamily = options.get("columnfamily", None)
         self.keyspace = options.get("keyspace", None)
         self.query = options.get("query", None)
+        self.metrics_scope = u"{0}.{1}".format(self.keyspace, self.columnfamily)
+        self.table_columns = list(columns)
         self.prepare_select_stmt = options.get("prepare_selects", properties.PREPARE_SELECTS_DEFAULT) == 'True'
+        self.fetch_size = int(options.get("fetch_size", properties.DEFAULT_FETCH_SIZE))
+        self.stream_pages = options.get("stream_pages", properties.STREAM_PAGES_DEFAULT) == 'True'
+        self.parallel_scan = options.get("parallel_scan", properties.PARALLEL_SCAN_DEFAULT) == 'True'
+        self.scan_splits = int(options.get("scan_splits", properties.DEFAULT_SCAN_SPLITS))
+        self.stats_ttl = float(options.get("stats_ttl", properties.DEFAULT_STATS_TTL))
+        self.scan_concurrency = int(options.get("scan_concurrency", properties.DEFAULT_SCAN_CONCURRENCY))
+        self.in_fanout = options.get("in_fanout", properties.IN_FANOUT_DEFAULT) == 'True'
+        self.fanout_concurrency = int(options.get("fanout_concurrency", properties.DEFAULT_FANOUT_CONCURRENCY))
+        self.snapshot = options.get("snapshot", properties.SNAPSHOT_DEFAULT) == 'True'
+        self.snapshot_refresh = float(options.get("snapshot_refresh", properties.DEFAULT_SNAPSHOT_REFRESH))
+        self.snapshot_shared = options.get("snapshot_shared", properties.SNAPSHOT_SHARED_DEFAULT) == 'True'
+        # PostgreSQL sizes every relation before building paths, and scans of the
+        # same foreign table share this provider: set by get_rel_size when any of
+        # them leaves the partition key unrestricted, until the next scan starts
+        self.unrestricted_planned = False
+        self.schema_cache_shared = options.get("schema_cache_shared", properties.SCHEMA_CACHE_SHARED_DEFAULT) == 'True'
+        self.null_insert_mode = options.get("null_insert_mode", properties.DEFAULT_NULL_INSERT_MODE)
+        if self.null_insert_mode not in ('bind', 'unset', 'omit'):
+            logger.log("Unknown null_insert_mode '{0}', use bind, unset or omit.".format(self.null_insert_mode), ERROR)
         self.init_connection(options, columns)
+        if self.null_insert_mode == 'unset' and self.cluster.protocol_version < 4:
+            # Unset values need protocol v4
+            logger.log("null_insert_mode 'unset' needs protocol v4, using 'omit'.", WARNING)
+            self.null_insert_mode = 'omit'
+        self.schema_check_interval = float(options.get("schema_check_interval", properties.DEFAULT_SCHEMA_CHECK_INTERVAL))
         start_time1 = time.time()
-        self.describe_db()
+        self.describe_db(self.connection.get_schema_version())
         end_time = time.time()
-        self.insert_stmt = None
-        self.delete_stmt = None
-        self.prepared_select_stmts = {}
+        metrics.observe(self.metrics_scope, 'describe', end_time - start_time1)
+        self.reset_statements()
+        self.write_pipeline = None
         if ISDEBUG:
             logger.log("DB described in {0} ms".format(int((end_time - start_time1) * 1000)))
             logger.log("initialized in {0} ms".format(int((end_time - start_time) * 1000)))
@@ -52,7 +88,6 @@ class CassandraProvider:
         start_time = time.time()
         if "hosts" not in options:
             logger.log("The hosts parameter is needed, setting to localhost.", WARNING)
-        hosts = options.get("hosts", "localhost").split(",")
         if "port" not in options:
             logger.log("The port parameter is needed, setting to {0}.".format(properties.DEFAULT_CASSANDRA_PORT), WARNING)
         self.port = options.get("port", properties.DEFAULT_CASSANDRA_PORT)
@@ -60,52 +95,131 @@ class CassandraProvider:
         self.allow_filtering = options.get("allow_filtering", properties.ALLOW_FILTERING_DEFAULT) == 'True'
         self.enable_trace = options.get("trace", properties.ENABLE_TRACE_STATEMENTS_DEFAULT) == 'True'
         self.ttl = int(options.get("ttl", properties.DEFAULT_TTL))
-        timeout = options.get("timeout", None)
-        username = options.get("username", None)
-        password = options.get("password", None)
-
-        self.cluster = Cluster(hosts)
-        if(username is not None):
-            self.cluster.auth_provider = PlainTextAuthProvider(username=username, password=password)
-        # Cassandra connection init
-        self.cluster.executor_threads = 4
-        self.cluster.connect_timeout = int(options.get("connection_timeout", properties.DEFAULT_CONNECTION_TIMEOUT))
-        self.session = self.cluster.connect()
+        self.modify_mode = options.get("modify_mode", properties.DEFAULT_MODIFY_MODE)
+        self.batch_size = int(options.get("batch_size", properties.DEFAULT_BATCH_SIZE))
+        self.batch_max_bytes = int(options.get("batch_max_bytes", properties.DEFAULT_BATCH_MAX_BYTES))
+        self.max_in_flight = int(options.get("max_in_flight", properties.DEFAULT_MAX_IN_FLIGHT))
+        self.read_consistency = self.get_consistency_level(options, "read_consistency")
+        self.write_consistency = self.get_consistency_level(options, "write_consistency")
+        self.pool_idle_timeout = float(options.get("pool_idle_timeout", properties.DEFAULT_POOL_IDLE_TIMEOUT))
+        self.connection = connection_pool.acquire(options)
+        self.cluster = self.connection.cluster
+        self.session = self.connection.session
         end_time = time.time()
         if ISDEBUG:
-            logger.log("connected in {0} ms".format(int((end_time - start_time) * 1000)))
-        if timeout is not None:
-            self.session.default_timeout = float(timeout)
+            logger.log("connection acquired in {0} ms".format(int((end_time - start_time) * 1000)))
 
-    def prepare_insert_stmt(self):
+    def get_consistency_level(self, options, option_name):
+        level = options.get(option_name, None)
+        if level is None:
+            return None
+        if level.upper() not in ConsistencyLevel.name_to_value:
+            logger.log("Unknown consistency level '{0}' in {1} option.".format(level, option_name), ERROR)
+        return ConsistencyLevel.name_to_value[level.upper()]
+
+    def read_statement(self, statement):
+        # Reads may be retried speculatively on another replica
+        statement.is_idempotent = True
+        if self.read_consistency is not None:
+            statement.consistency_level = self.read_consistency
+        return statement
+
+    def bind_write(self, prepared, args):
+        statement = prepared.bind(args)
+        if self.write_consistency is not None:
+            statement.consistency_level = self.write_consistency
+        return statement
+
+    def prepare(self, stmt):
+        return self.connection.statements.prepare(stmt, self.keyspace, self.columnfamily)
+
+    def build_insert_stmt(self, columns):
         insert_stmt_str = u"INSERT INTO {0}.{1} ({2}) VALUES ({3})".format(
-            self.keyspace, self.columnfamily, u",".join(self.queryableColumns), u",".join([u"?"] * len(self.queryableColumns)))
+            self.keyspace, self.columnfamily, u",".join(columns), u",".join([u"?"] * len(columns)))
         if self.ttl != 0:
             insert_stmt_str += " USING TTL {0}".format(self.ttl)
         if ISDEBUG:
             logger.log("insert statement: {0}".format(insert_stmt_str))
-            logger.log("preparing insert statement")
-            st = time.time()
-        self.insert_stmt = self.session.prepare(insert_stmt_str)
-        if ISDEBUG:
-            logger.log("insert statement prepared in {0} ms".format((time.time() - st) * 1000))
+        return insert_stmt_str
 
-    def prepare_delete_stmt(self):
-        delete_stmt_str = u"DELETE FROM {0}.{1} WHERE {2};".format(self.keyspace, self.columnfamily, u" AND ".join(map(lambda str: str + u" = ?", self.rowIdColumns)))
+    def build_update_stmt(self, columns):
+        update_stmt_str = u"UPDATE {0}.{1}".format(self.keyspace, self.columnfamily)
+        if self.ttl != 0:
+            update_stmt_str += u" USING TTL {0}".format(self.ttl)
+        update_stmt_str += u" SET {0} WHERE {1}".format(u", ".join([c + u" = ?" for c in columns]), u" AND ".join([c + u" = ?" for c in self.rowIdColumns]))
         if ISDEBUG:
-            logger.log("preparing delete statement")
-            st = time.time()
-        self.delete_stmt = self.session.prepare(delete_stmt_str)
+            logger.log("update statement: {0}".format(update_stmt_str))
+        return update_stmt_str
+
+    def build_increment_stmt(self, columns):
+        # Counter tables take no TTL
+        return u"UPDATE {0}.{1} SET {2} WHERE {3}".format(self.keyspace, self.columnfamily, u", ".join([u"{0} = {0} + ?".format(c) for c in columns]),
+                                                          u" AND ".join([c + u" = ?" for c in self.rowIdColumns]))
+
+    def build_delete_stmt(self):
+        return u"DELETE FROM {0}.{1} WHERE {2};".format(self.keyspace, self.columnfamily, u" AND ".join(map(lambda str: str + u" = ?", self.rowIdColumns)))
+
+    def build_read_row_stmt(self, columns):
+        return u"SELECT {0} FROM {1}.{2} WHERE {3}".format(u",".join(map(lambda c: '"{0}"'.format(c), columns)), self.keyspace, self.columnfamily,
+                                                           u" AND ".join([c + u" = ?" for c in self.rowIdColumns]))
+
+    def reset_statements(self):
+        # Everything built from the table description
+        self.insert_stmt_str = None
+        self.insert_stmt_strs = {}
+        self.delete_stmt_str = None
+        self.rowid_types = None
+        self.update_stmt_strs = {}
+        self.increment_stmt_strs = {}
+        self.read_row_stmt_str = None
+        self.recent_rows = OrderedDict()
+        self.row_decoders = {}
+        self.select_plans = {}
+        self.pipeline_statements = {}
+
+    def check_schema(self):
+        # Called when a transaction begins. Without schema metadata the driver
+        # gets no schema change events, the schema version is polled instead
+        now = time.time()
+        if now - self.schema_checked_at < self.schema_check_interval:
+            return
+        self.schema_checked_at = now
+        schema_version = self.connection.get_schema_version()
+        if schema_version is None or schema_version == self.schema_version:
+            return
         if ISDEBUG:
-            logger.log("delete statement prepared in {0} ms".format((time.time() - st) * 1000))
+            logger.log(u"schema version changed from {0} to {1}".format(self.schema_version, schema_version))
+        self.describe_db(schema_version)
+        self.reset_statements()
 
-    def describe_db(self):
+    def describe_db(self, schema_version):
+        self.schema_version = schema_version
+        self.schema_checked_at = time.time()
+        self.connection.refresh_table(self.keyspace, self.columnfamily, schema_version)
+        descriptor = table_descriptors.get_descriptor(self.connection, self.keyspace, self.columnfamily, schema_version,
+                                                      self.schema_cache_shared, self.read_table_descriptor)
+        self.queryableColumns = descriptor.queryableColumns
+        self.querableColumnsIdx = descriptor.querableColumnsIdx
+        self.columnsTypes = descriptor.columnsTypes
+        self.indexes = descriptor.indexes
+        self.rowIdColumns = descriptor.rowIdColumns
+        self.partitionKeyColumns = descriptor.partitionKeyColumns
+        self.clusteringKeyColumns = descriptor.clusteringKeyColumns
+        self.clusteringReversed = descriptor.clusteringReversed
+        self.columnsEncoders = dict([(c, types_mapper.get_encoder(self.columnsTypes[c])) for c in self.columnsTypes])
+        self.insertEncoders = [(col, self.columnsEncoders[col]) for col in self.queryableColumns]
+        # Every regular column of a counter table is a counter, rows are only written by increments
+        self.counterColumns = sorted([c for c in self.queryableColumns if self.columnsTypes[c].main_type == cassandra_types.cql_counter])
+        # Snapshot rows start with the primary key, the partition key being the index key
+        self.snapshot_columns = tuple(self.rowIdColumns + sorted([c for c in self.table_columns if c in self.queryableColumns and c not in self.rowIdColumns]))
 
-        self.queryableColumns = {}
-        self.querableColumnsIdx = {}
-        self.columnsTypes = {}
-        self.indexes = {}
-        self.rowIdColumns = []
+    def read_table_descriptor(self):
+        queryableColumns = {}
+        querableColumnsIdx = {}
+        validators = {}
+        columnNames = []
+        indexes = {}
+        rowIdColumns = []
         is_mv = False
         keyspace = self.cluster.metadata.keyspaces[self.keyspace]
         if self.columnfamily not in keyspace.tables:
@@ -115,14 +229,17 @@ class CassandraProvider:
             table = keyspace.tables[self.columnfamily]
         pkeys = [pk.name for pk in table.partition_key]
         ckeys = [ck.name for ck in table.clustering_key]
+        partitionKeyColumns = pkeys
+        clusteringKeyColumns = ckeys
+        clusteringReversed = dict([(ck.name, ck.is_reversed) for ck in table.clustering_key])
         if not is_mv:
             for idx in table.indexes:
                 idx_options = table.indexes[idx].index_options
                 if "target" in idx_options:
                     if "class_name" in idx_options:
-                        self.indexes[idx_options["target"]] = idx_options["class_name"]
+                        indexes[idx_options["target"]] = idx_options["class_name"]
                     else:
-                        self.indexes[idx_options["target"]] = ""
+                        indexes[idx_options["target"]] = ""
 
         columns = table.columns
         componentIdx = 0
@@ -156,108 +273,363 @@ class CassandraProvider:
                     componentIdx = 0
                 else:
                     componentIdx += 1
-            if columnName in self.indexes:
+            if columnName in indexes:
                 cost = self.IDX_QUERY_COST
             if is_primary_key:
-                self.rowIdColumns.append(columnName)
-            self.queryableColumns[columnName] = cost
-            self.querableColumnsIdx[columnName] = componentIdx + cost
-            self.columnsTypes[columnName] = types_mapper.get_cql_type_from_validator(col.cql_type)
+                rowIdColumns.append(columnName)
+            queryableColumns[columnName] = cost
+            querableColumnsIdx[columnName] = componentIdx + cost
+            validators[columnName] = col.cql_type
+            columnNames.append(columnName)
+        return table_descriptors.TableDescriptor(columnNames, validators, queryableColumns, querableColumnsIdx, indexes, rowIdColumns,
+                                                 partitionKeyColumns, clusteringKeyColumns, clusteringReversed)
 
     def insert(self, new_values):
-        if self.insert_stmt is None:
-            self.prepare_insert_stmt()
+        insert_stmt = self.get_insert_stmt(new_values)
         args = self.get_insert_args(new_values)
         if ISDEBUG:
             logger.log("requested insert {0}".format(args))
-            st = time.time()
-        self.session.execute(self.insert_stmt, args)
+        st = time.time()
+        self.session.execute(self.bind_write(insert_stmt, args))
+        metrics.observe_since(self.metrics_scope, 'insert', st)
+        self.invalidate_snapshot()
         if ISDEBUG:
             et = time.time()
             logger.log("insert completed in {0} ms".format((et - st) * 1000))
         return new_values
 
     def get_insert_args(self, new_values):
-        sorted_args = []
-        for col in self.queryableColumns:
-            sorted_args.append(types_mapper.map_object_to_type(new_values[col], self.columnsTypes[col]))
-        return sorted_args
+        if self.null_insert_mode == 'bind':
+            return [encode(new_values[col]) for col, encode in self.insertEncoders]
+        # NULL columns are left unset or out of the statement, so they don't write tombstones
+        args = []
+        for col, encode in self.insertEncoders:
+            value = new_values.get(col, None)
+            if value is not None:
+                args.append(encode(value))
+            elif self.null_insert_mode == 'unset':
+                args.append(UNSET_VALUE)
+        return args
+
+    def get_insert_mask(self, new_values):
+        mask = 0
+        for i in range(0, len(self.insertEncoders)):
+            if new_values.get(self.insertEncoders[i][0], None) is not None:
+                mask |= 1 << i
+        return mask
 
     def get_delete_args(self, row_id_value):
-        ids = json.loads(row_id_value)
-        values = []
-        for i in range(0, len(self.rowIdColumns)):
-            columnName = self.rowIdColumns[i]
-            values.append(types_mapper.map_object_to_type(ids[i], self.columnsTypes[columnName]))
-        return values
+        return self.decode_rowid(row_id_value)
 
-    def get_insert_stmt(self):
-        if self.insert_stmt is None:
-            self.prepare_insert_stmt()
-        return self.insert_stmt
+    def get_rowid_types(self):
+        # Driver types of the primary key, in the order of the delete statement bind markers
+        if self.rowid_types is None:
+            self.rowid_types = [c.type for c in self.get_delete_stmt().column_metadata]
+        return self.rowid_types
+
+    def decode_rowid(self, rowid):
+        return rowid_codec.decode_rowid(rowid, self.get_rowid_types(), self.cluster.protocol_version)
+
+    def get_rowid_encoder(self, filtered_columns):
+        positions = [filtered_columns.index(c) for c in self.rowIdColumns]
+        return rowid_codec.compile_rowid_encoder(self.get_rowid_types(), positions, self.cluster.protocol_version)
+
+    def get_insert_stmt(self, new_values):
+        if self.null_insert_mode == 'omit':
+            return self.get_partial_insert_stmt(self.get_insert_mask(new_values))
+        if self.insert_stmt_str is None:
+            self.insert_stmt_str = self.build_insert_stmt([col for col, encode in self.insertEncoders])
+        return self.prepare(self.insert_stmt_str)
+
+    def get_partial_insert_stmt(self, mask):
+        # One statement per set of non-null columns
+        insert_stmt_str = self.insert_stmt_strs.get(mask, None)
+        if insert_stmt_str is None:
+            insert_stmt_str = self.build_insert_stmt([self.insertEncoders[i][0] for i in range(0, len(self.insertEncoders)) if mask & (1 << i)])
+            self.insert_stmt_strs[mask] = insert_stmt_str
+        return self.prepare(insert_stmt_str)
 
     def get_delete_stmt(self):
-        if self.delete_stmt is None:
-            self.prepare_delete_stmt()
-        return self.delete_stmt
+        if self.delete_stmt_str is None:
+            self.delete_stmt_str = self.build_delete_stmt()
+        return self.prepare(self.delete_stmt_str)
+
+    def get_update_stmt(self, columns):
+        update_stmt_str = self.update_stmt_strs.get(columns, None)
+        if update_stmt_str is None:
+            update_stmt_str = self.build_update_stmt(columns)
+            self.update_stmt_strs[columns] = update_stmt_str
+        return self.prepare(update_stmt_str)
+
+    def get_increment_stmt(self, columns):
+        increment_stmt_str = self.increment_stmt_strs.get(columns, None)
+        if increment_stmt_str is None:
+            increment_stmt_str = self.build_increment_stmt(columns)
+            self.increment_stmt_strs[columns] = increment_stmt_str
+        return self.prepare(increment_stmt_str)
+
+    def get_modify_key(self, item):
+        # Updates and increments need a statement per set of columns
+        if item[0] == 'update' or item[0] == 'increment':
+            return (item[0], item[1][0])
+        if item[0] == 'insert' and self.null_insert_mode == 'omit':
+            return self.get_insert_mask(item[1])
+        return item[0]
+
+    def get_modify_stmt(self, item):
+        if item[0] == 'insert':
+            return self.get_insert_stmt(item[1])
+        elif item[0] == 'delete':
+            return self.get_delete_stmt()
+        elif item[0] == 'update':
+            return self.get_update_stmt(item[1][0])
+        elif item[0] == 'increment':
+            return self.get_increment_stmt(item[1][0])
+        raise ValueError('unknown modify item type')
+
+    def get_modify_args(self, item):
+        if item[0] == 'insert':
+            return self.get_insert_args(item[1])
+        elif item[0] == 'update' or item[0] == 'increment':
+            return item[1][1]
+        return self.get_delete_args(item[1])
+
+    def get_update_items(self, rowid, new_values):
+        # Only the columns that differ from the row read by the scan are written
+        if len(self.counterColumns) > 0:
+            return [self.get_counter_update_item(rowid, new_values)]
+        old_row = self.get_recent_row(rowid)
+        key_values = self.decode_rowid(rowid)
+        for i in range(0, len(self.rowIdColumns)):
+            column_name = self.rowIdColumns[i]
+            if predicates.normalize_value(new_values.get(column_name, None), self.columnsTypes[column_name]) != key_values[i]:
+                logger.log("The primary key of a row can't be changed.", ERROR)
+        columns = []
+        args = []
+        for column_name, encode in self.insertEncoders:
+            if column_name in self.rowIdColumns or column_name not in new_values:
+                continue
+            if old_row is not None and column_name in old_row[1]:
+                cql_type = self.columnsTypes[column_name]
+                if predicates.normalize_value(old_row[0][self.table_columns.index(column_name)], cql_type) == predicates.normalize_value(new_values[column_name], cql_type):
+                    continue
+            columns.append(column_name)
+            args.append(encode(new_values[column_name]))
+        if len(columns) == 0:
+            metrics.increment(self.metrics_scope, 'unchanged_updates')
+            return []
+        return [('update', (tuple(columns), args + key_values))]
+
+    def get_increment_item(self, new_values):
+        # Key values take the driver form, so increments from inserts and updates of a row are summed together
+        key_values = [predicates.normalize_value(new_values.get(c, None), self.columnsTypes[c]) for c in self.rowIdColumns]
+        deltas = [self.columnsEncoders[c](new_values.get(c, None)) or 0 for c in self.counterColumns]
+        return ('increment', (key_values, deltas))
+
+    def get_counter_update_item(self, rowid, new_values):
+        # Counters are incremented by the difference with the row read by the scan
+        old_row = self.get_recent_row(rowid)
+        if old_row is None:
+            logger.log("The counter row to update no longer exists.", ERROR)
+        key_values = self.decode_rowid(rowid)
+        for i in range(0, len(self.rowIdColumns)):
+            column_name = self.rowIdColumns[i]
+            if predicates.normalize_value(new_values.get(column_name, None), self.columnsTypes[column_name]) != key_values[i]:
+                logger.log("The primary key of a counter row can't be changed.", ERROR)
+        deltas = []
+        for column_name in self.counterColumns:
+            if column_name not in old_row[1]:
+                logger.log("Counter {0} was not read, its increment is unknown.".format(column_name), ERROR)
+            old_value = old_row[0][self.table_columns.index(column_name)] or 0
+            deltas.append((self.columnsEncoders[column_name](new_values.get(column_name, None)) or 0) - old_value)
+        return ('increment', (key_values, deltas))
+
+    def coalesce_increments(self, modify_items):
+        # Increments of a row are summed into one write, sent where the first one was
+        coalesced = []
+        totals = {}
+        for item in modify_items:
+            if item[0] != 'increment':
+                coalesced.append(item)
+                continue
+            key_values, deltas = item[1]
+            key = tuple(key_values)
+            total = totals.get(key, None)
+            if total is None:
+                totals[key] = list(deltas)
+                coalesced.append(('increment', key))
+            else:
+                for i in range(0, len(deltas)):
+                    total[i] += deltas[i]
+        items = []
+        for item in coalesced:
+            if item[0] != 'increment':
+                items.append(item)
+                continue
+            deltas = totals[item[1]]
+            columns = tuple([self.counterColumns[i] for i in range(0, len(deltas)) if deltas[i] != 0])
+            if len(columns) > 0:
+                items.append(('increment', (columns, [d for d in deltas if d != 0] + list(item[1]))))
+        metrics.increment(self.metrics_scope, 'coalesced_increments', len(modify_items) - len(items))
+        return items
+
+    def remember_row(self, rowid, line, filtered_columns):
+        # Rows read with their rowid are kept for the UPDATE that usually follows
+        # Least recently read rows are dropped first
+        self.recent_rows.pop(rowid, None)
+        if len(self.recent_rows) >= properties.RECENT_ROWS_CACHE_SIZE:
+            self.recent_rows.popitem(last=False)
+        self.recent_rows[rowid] = (line, filtered_columns)
+
+    def get_recent_row(self, rowid):
+        # Rows dropped since the scan read them, when it ran long before the
+        # updates, are read again by primary key
+        old_row = self.recent_rows.get(rowid, None)
+        if old_row is None:
+            old_row = self.read_row(rowid)
+        return old_row
+
+    def read_row(self, rowid):
+        columns = [c for c in self.table_columns if c in self.queryableColumns and c not in self.rowIdColumns]
+        if self.read_row_stmt_str is None:
+            self.read_row_stmt_str = self.build_read_row_stmt(columns)
+        statement = self.read_statement(self.prepare(self.read_row_stmt_str).bind(self.decode_rowid(rowid)))
+        metrics.increment(self.metrics_scope, 'row_rereads')
+        columns_key = (tuple(columns), False)
+        decoder = self.row_decoders.get(columns_key, None)
+        if decoder is None:
+            decoder = row_decoders.RowDecoder(self.table_columns, columns, self.columnsTypes, self.ROWIDCOLUMN, None)
+            self.row_decoders[columns_key] = decoder
+        for row in self.session.execute(statement):
+            return (decoder.decode(row), columns)
+        return None
+
+    def submit_modify_item(self, item):
+        if self.write_pipeline is None:
+            self.write_pipeline = write_pipeline.WritePipeline(self.session, self.max_in_flight)
+        key = self.get_modify_key(item)
+        statement = self.pipeline_statements.get(key, None)
+        if statement is None:
+            statement = self.get_modify_stmt(item)
+            self.pipeline_statements[key] = statement
+        self.write_pipeline.submit(self.bind_write(statement, self.get_modify_args(item)), None)
+        metrics.increment(self.metrics_scope, 'pipeline_writes')
+
+    def reset_write_pipeline(self):
+        self.pipeline_statements = {}
+        if self.write_pipeline is not None:
+            self.invalidate_snapshot()
+            self.write_pipeline.reset()
+
+    def drain_write_pipeline(self):
+        self.pipeline_statements = {}
+        if self.write_pipeline is not None:
+            self.invalidate_snapshot()
+            st = time.time()
+            try:
+                self.write_pipeline.drain()
+            except Exception:
+                metrics.increment(self.metrics_scope, 'write_errors')
+                raise
+            finally:
+                metrics.observe_since(self.metrics_scope, 'pipeline_drain', st)
 
     def execute_modify_items(self, modify_items, concurency):
+        if len(self.counterColumns) > 0:
+            modify_items = self.coalesce_increments(modify_items)
         if len(modify_items) == 0:
             return {}
         statements_and_params = []
         if ISDEBUG:
             logger.log("prepare data for cassandra")
             st = time.time()
+        statements = {}
         for item in modify_items:
-            if item[0] == 'insert':
-                statements_and_params.append((self.get_insert_stmt(), self.get_insert_args(item[1])))
-            elif item[0] == 'delete':
-                statements_and_params.append((self.get_delete_stmt(), self.get_delete_args(item[1])))
-            else:
-                raise ValueError('unknown modify item type')
+            key = self.get_modify_key(item)
+            statement = statements.get(key, None)
+            if statement is None:
+                statement = self.get_modify_stmt(item)
+                statements[key] = statement
+            statements_and_params.append((self.bind_write(statement, self.get_modify_args(item)), None))
+        if self.modify_mode == 'unlogged_batch':
+            statements_and_params = modify_batches.group_unlogged_batches(statements_and_params, self.batch_size, self.write_consistency,
+                                                                          len(self.counterColumns) > 0, self.batch_max_bytes)
         if ISDEBUG:
             logger.log("prepare data finished in {0} ms".format((time.time() - st) * 1000))
-            logger.log("start modify operation. count: {0}".format(len(modify_items)))
-            st = time.time()
-        if len(statements_and_params) == 1:
-            self.session.execute(statements_and_params[0][0], statements_and_params[0][1])
-        else:
-            execute_concurrent(self.session, statements_and_params, raise_on_first_error=True, concurrency=concurency)
+            logger.log("start modify operation. count: {0}, requests: {1}".format(len(modify_items), len(statements_and_params)))
+        st = time.time()
+        metrics.increment(self.metrics_scope, 'modified_rows', len(modify_items))
+        metrics.increment(self.metrics_scope, 'write_requests', len(statements_and_params))
+        try:
+            if len(statements_and_params) == 1:
+                self.session.execute(statements_and_params[0][0], statements_and_params[0][1])
+            else:
+                execute_concurrent(self.session, statements_and_params, raise_on_first_error=True, concurrency=concurency)
+        except Exception:
+            metrics.increment(self.metrics_scope, 'write_errors')
+            raise
+        metrics.observe_since(self.metrics_scope, 'modify', st)
+        self.invalidate_snapshot()
         if ISDEBUG:
             logger.log("modify completed in {0} ms".format((time.time() - st) * 1000))
         
 
     def delete(self, rowid):
-        if self.delete_stmt is None:
-            self.prepare_delete_stmt()
+        delete_stmt = self.get_delete_stmt()
         if ISDEBUG:
             logger.log(u"requested delete for id: {0}".format(rowid))
         values = self.get_delete_args(rowid)
-        if ISDEBUG:
-            st = time.time()
-        self.session.execute(self.delete_stmt, values)
+        st = time.time()
+        self.session.execute(self.bind_write(delete_stmt, values))
+        metrics.observe_since(self.metrics_scope, 'delete', st)
+        self.invalidate_snapshot()
         if ISDEBUG:
             et = time.time()
             logger.log("delete completed in {0} ms".format((et - st) * 1000))
         return {}
 
-    def build_select_stmt(self, quals, columns, allow_filtering, verbose=False):
-        
+    def build_select_stmt(self, quals, columns, allow_filtering, verbose=False, sortkeys=None, limit=None):
+        plan = self.get_select_plan(quals, columns, allow_filtering, verbose, sortkeys, limit is not None)
+        if plan is None:
+            return None
+        return (plan.statement, plan.bind(quals, limit), plan.filtered_columns)
+
+    def get_select_plan(self, quals, columns, allow_filtering, verbose=False, sortkeys=None, limited=False):
+        shape = query_plan.get_shape(quals, columns, allow_filtering, sortkeys, limited)
+        if shape in self.select_plans:
+            return self.select_plans[shape]
+        plan = self.compile_select_plan(quals, columns, allow_filtering, verbose, sortkeys, limited)
+        if len(self.select_plans) >= properties.SELECT_PLAN_CACHE_SIZE:
+            self.select_plans.clear()
+        self.select_plans[shape] = plan
+        return plan
+
+    def compile_select_plan(self, quals, columns, allow_filtering, verbose=False, sortkeys=None, limited=False):
         stmt_str = StringIO()
         usedQuals = {}
+        eqPartitionKeys = 0
+        fanoutPartitionKeys = 0
+        fanout = []
+        pushedQuals = set()
+        residual = []
         filteredColumns = []
-        rowid = None
-        binding_values = []
+        rowid_idx = None
+        binders = []
+        sortkeys = sortkeys or []
         for col in columns:
             if col != self.ROWIDCOLUMN:
                 filteredColumns.append(col)
         if (self.query):
             stmt_str.write(self.query)
         else:
-            for col in self.rowIdColumns:
-                if col not in filteredColumns:
-                    filteredColumns.append(col)
-            stmt_str.write(u"SELECT {0} FROM {1}.{2}".format(",".join(map(lambda c: '"{0}"'.format(c), filteredColumns)), self.keyspace, self.columnfamily))
+            # The primary key is only fetched when the rowid is requested, for UPDATE and DELETE
+            if self.ROWIDCOLUMN in columns:
+                for col in self.rowIdColumns:
+                    if col not in filteredColumns:
+                        filteredColumns.append(col)
+            for key in sortkeys:
+                if key.attname not in filteredColumns:
+                    filteredColumns.append(key.attname)
             isWhere = None
             eqRestricted = None
             rangeUsed = False
@@ -267,42 +639,52 @@ class CassandraProvider:
             else:
                 formatting_str = '%s'
 
-            for qual in quals:
-                if qual.field_name == self.ROWIDCOLUMN:
-                    rowid = qual.value
+            # IN lists on the partition key are split into one query per
+            # partition when every partition key column is restricted
+            restricted = set([q.field_name for q in quals if q.value is not None and (q.operator == "=" or q.operator == (u"=", True))])
+            fanoutAllowed = self.in_fanout and self.prepare_select_stmt and all([c in restricted for c in self.partitionKeyColumns])
+
+            componentIdx = []
+            for idx in range(0, len(quals)):
+                qual = quals[idx]
+                if qual.field_name == self.ROWIDCOLUMN and qual.value is not None:
+                    rowid_idx = idx
                 if qual.field_name in self.queryableColumns:
-                    qual.componentIdx = self.querableColumnsIdx[qual.field_name]
+                    componentIdx.append(self.querableColumnsIdx[qual.field_name])
                 else:
-                    qual.componentIdx = 10000
+                    componentIdx.append(10000)
 
-            if rowid is not None:
-                ids = json.loads(rowid)
-                for i in range(0, len(self.rowIdColumns)):
-                    columnName = self.rowIdColumns[i]
-                    binding_values.append(types_mapper.map_object_to_type(ids[i], self.columnsTypes[columnName]))
+            if rowid_idx is not None:
+                binders.append(query_plan.rowid_binder(rowid_idx, self.decode_rowid))
+                pushedQuals.add(rowid_idx)
                 stmt_str.write(u" WHERE {0}".format(u" AND ".join(map(lambda str: str + u" = " + formatting_str, self.rowIdColumns))))
             else:
-                sortedQuals = sorted(quals, key=lambda qual: qual.componentIdx)
+                sortedQuals = sorted(range(0, len(quals)), key=lambda idx: componentIdx[idx])
                 last_clustering_key_idx = 0
-                for qual in sortedQuals:
+                for idx in sortedQuals:
+                    qual = quals[idx]
+                    qualComponentIdx = componentIdx[idx]
                     # Partition key and clustering column can't be null
-                    if qual.componentIdx < self.IDX_QUERY_COST and qual.value is None:
+                    if qualComponentIdx < self.IDX_QUERY_COST and qual.value is None:
                         return None
                     if ISDEBUG or verbose:
-                        logger.log(u"qual field {0}; qual index {1}; qual type {2}; qual operator: {4}; qual value {3}".format(qual.field_name, qual.componentIdx, type(qual.operator), qual.value, qual.operator))
+                        logger.log(u"qual field {0}; qual index {1}; qual type {2}; qual operator: {4}; qual value {3}".format(qual.field_name, qualComponentIdx, type(qual.operator), qual.value, qual.operator))
                     if qual.operator == "=":
                         if (qual.field_name in self.queryableColumns and self.queryableColumns[qual.field_name] != self.REGULAR_QUERY_COST):
                             if self.queryableColumns[qual.field_name] == self.CLUSTERING_KEY_QUERY_COST:
-                                if last_clustering_key_idx == 0 and qual.componentIdx != self.CLUSTERING_KEY_QUERY_COST:
+                                if last_clustering_key_idx == 0 and qualComponentIdx != self.CLUSTERING_KEY_QUERY_COST:
                                     eqRestricted = True
-                                elif qual.componentIdx - 1 != last_clustering_key_idx and last_clustering_key_idx != 0:
+                                elif qualComponentIdx - 1 != last_clustering_key_idx and last_clustering_key_idx != 0:
                                     eqRestricted = True
                             if (qual.field_name not in usedQuals and not eqRestricted):
-                                usedQuals[qual.field_name] = qual.value
+                                usedQuals[qual.field_name] = True
+                                if self.queryableColumns[qual.field_name] == self.PARTITION_KEY_QUERY_COST:
+                                    eqPartitionKeys += 1
                                 if self.queryableColumns[qual.field_name] == self.CLUSTERING_KEY_QUERY_COST:
-                                    last_clustering_key_idx = qual.componentIdx
+                                    last_clustering_key_idx = qualComponentIdx
                                 formatted = u" {0} = {1} ".format(qual.field_name, formatting_str)
-                                binding_values.append(types_mapper.map_object_to_type(qual.value, self.columnsTypes[qual.field_name]))
+                                binders.append(query_plan.value_binder(idx, self.columnsEncoders[qual.field_name]))
+                                pushedQuals.add(idx)
                                 if isWhere:
                                     stmt_str.write(u" AND ")
                                     stmt_str.write(formatted)
@@ -312,7 +694,8 @@ class CassandraProvider:
                                     isWhere = 1
                             elif allow_filtering:
                                 formatted = u" {0} = {1} ".format(qual.field_name, formatting_str)
-                                binding_values.append(types_mapper.map_object_to_type(qual.value, self.columnsTypes[qual.field_name]))
+                                binders.append(query_plan.value_binder(idx, self.columnsEncoders[qual.field_name]))
+                                pushedQuals.add(idx)
                                 if isWhere:
                                     stmt_str.write(u" AND ")
                                     stmt_str.write(formatted)
@@ -322,7 +705,8 @@ class CassandraProvider:
                                     isWhere = 1
                         elif allow_filtering:
                             formatted = u" {0} = {1} ".format(qual.field_name, formatting_str)
-                            binding_values.append(types_mapper.map_object_to_type(qual.value, self.columnsTypes[qual.field_name]))
+                            binders.append(query_plan.value_binder(idx, self.columnsEncoders[qual.field_name]))
+                            pushedQuals.add(idx)
                             if isWhere:
                                 stmt_str.write(u" AND ")
                                 stmt_str.write(formatted)
@@ -335,16 +719,15 @@ class CassandraProvider:
                         if (qual.field_name in self.queryableColumns):
                             if (self.queryableColumns[qual.field_name] == self.CLUSTERING_KEY_QUERY_COST or self.queryableColumns[qual.field_name] == self.PARTITION_KEY_QUERY_COST):
                                 if (qual.field_name not in usedQuals and not eqRestricted and not rangeUsed):
-                                    usedQuals[qual.field_name] = qual.value
-                                    formatted = u"{0} IN {1}".format(qual.field_name, formatting_str)
-                                    binding_value = []
-                                    for el in qual.value:
-                                        binding_value.append(types_mapper.map_object_to_type(el, self.columnsTypes[qual.field_name]))
-                                    if self.prepare_select_stmt:
-                                        binding_values.append(binding_value)
+                                    usedQuals[qual.field_name] = True
+                                    if fanoutAllowed and self.queryableColumns[qual.field_name] == self.PARTITION_KEY_QUERY_COST:
+                                        fanoutPartitionKeys += 1
+                                        fanout.append(len(binders))
+                                        formatted = u"{0} = {1}".format(qual.field_name, formatting_str)
                                     else:
-                                        binding_values.append(ValueSequence(binding_value))
-
+                                        formatted = u"{0} IN {1}".format(qual.field_name, formatting_str)
+                                    binders.append(query_plan.list_binder(idx, self.columnsEncoders[qual.field_name], self.prepare_select_stmt))
+                                    pushedQuals.add(idx)
                                     if isWhere:
                                         stmt_str.write(u" AND ")
                                         stmt_str.write(formatted)
@@ -353,12 +736,8 @@ class CassandraProvider:
                                         stmt_str.write(formatted)
                                         isWhere = 1
                     elif (qual.operator == "~" or qual.operator == "~~") and qual.field_name in self.indexes and self.indexes[qual.field_name] == "org.apache.cassandra.index.sasi.SASIIndex":
-                        if qual.operator == "~":
-                            val = "%{0}%".format(qual.value)
-                        else:
-                            val = qual.value
                         stmt_str.write(u" AND {0} LIKE {1}".format(qual.field_name, formatting_str))
-                        binding_values.append(types_mapper.map_object_to_type(val, self.columnsTypes[qual.field_name]))
+                        binders.append(query_plan.like_binder(idx, self.columnsEncoders[qual.field_name], qual.operator == "~"))
                     else:
                         if (qual.operator == ">" or qual.operator == "<" or qual.operator == ">=" or qual.operator == "<="):
                             if (qual.field_name in self.queryableColumns 
@@ -367,80 +746,302 @@ class CassandraProvider:
                             or (qual.field_name in self.indexes and self.indexes[qual.field_name] == "org.apache.cassandra.index.sasi.SASIIndex"))
                             or (allow_filtering and self.queryableColumns[qual.field_name] != self.PARTITION_KEY_QUERY_COST)):
                                 rangeUsed = True
+                                binders.append(query_plan.value_binder(idx, self.columnsEncoders[qual.field_name]))
+                                pushedQuals.add(idx)
                                 if isWhere:
                                     stmt_str.write(u" AND {0} {1} {2}".format(qual.field_name, qual.operator, formatting_str))
-                                    binding_values.append(types_mapper.map_object_to_type(qual.value, self.columnsTypes[qual.field_name]))
                                 else:
                                     stmt_str.write(u" WHERE {0} {1} {2}".format(qual.field_name, qual.operator, formatting_str))
                                     isWhere = 1
-                                    binding_values.append(types_mapper.map_object_to_type(qual.value, self.columnsTypes[qual.field_name]))
 
-        if (self.limit):
+            # Quals Cassandra can't enforce are checked on the raw rows, before they are decoded,
+            # as long as Python keeps the same rows as PostgreSQL's recheck
+            for idx in range(0, len(quals)):
+                qual = quals[idx]
+                if idx in pushedQuals or qual.field_name not in self.queryableColumns:
+                    continue
+                if not predicates.is_exact(qual.operator, self.columnsTypes[qual.field_name]):
+                    continue
+                if qual.value is None and qual.operator not in predicates.EQUALITY_OPERATORS:
+                    continue
+                if qual.field_name not in filteredColumns:
+                    filteredColumns.append(qual.field_name)
+                residual.append((idx, filteredColumns.index(qual.field_name), self.columnsTypes[qual.field_name]))
+
+        # Rows of a single partition come back in clustering order, anything
+        # wider is sorted once it has been fetched
+        client_sort = []
+        merge_keys = []
+        if len(sortkeys) > 0 and rowid_idx is None:
+            if not self.query and eqPartitionKeys + fanoutPartitionKeys == len(self.partitionKeyColumns):
+                if sortkeys[0].is_reversed != self.clusteringReversed[sortkeys[0].attname]:
+                    stmt_str.write(u" ORDER BY {0}".format(u", ".join(map(lambda k: u"{0} {1}".format(k.attname, u"DESC" if k.is_reversed else u"ASC"), sortkeys))))
+                if len(fanout) > 0:
+                    merge_keys = [(filteredColumns.index(k.attname), k.is_reversed) for k in sortkeys]
+            else:
+                client_sort = [(filteredColumns.index(k.attname), k.is_reversed) for k in sortkeys]
+        # A query LIMIT can only be applied when nothing is left for PostgreSQL to filter
+        exact = len(pushedQuals) == len(quals)
+        enforced = len(pushedQuals) + len(residual) == len(quals)
+        if limited and exact and len(client_sort) == 0 and not self.query:
+            stmt_str.write(u" LIMIT {0}".format(formatting_str))
+            binders.append(query_plan.limit_binder(self.limit))
+        elif (self.limit):
             stmt_str.write(u" LIMIT {0}".format(self.limit))
         if allow_filtering:
             stmt_str.write(u" ALLOW FILTERING ")
         statement = stmt_str.getvalue()
+        if not self.query:
+            statement = u"SELECT {0} FROM {1}.{2}".format(",".join(map(lambda c: '"{0}"'.format(c), filteredColumns)), self.keyspace, self.columnfamily) + statement
         stmt_str.close()
         if ISDEBUG:
             logger.log(u"CQL query: {0}".format(statement), INFO)
-        return (statement, binding_values, filteredColumns)
+        return query_plan.SelectPlan(statement, filteredColumns, binders, client_sort, exact, fanout, merge_keys, residual, enforced)
 
 
-    def execute(self, quals, columns, sortkeys=None):
+    def execute(self, quals, columns, sortkeys=None, limit=None, offset=None):
         if ISDEBUG:
-            logger.log("building select statement... Quals: {0}, columns: {1}, sortkeys: {2}, allow filtering: {3}".format(quals, columns, sortkeys, self.allow_filtering))
-        res = self.build_select_stmt(quals, columns, self.allow_filtering)
-        if res is None:
-            yield {}
-            return
-        stmt = res[0]
-        binding_values = res[1]
-        filtered_columns = res[2]
-        if self.prepare_select_stmt:
-            if stmt not in self.prepared_select_stmts:
-                if ISDEBUG:
-                    logger.log(u"preparing statement...")
-                self.prepared_select_stmts[stmt] = self.session.prepare(stmt)
-            elif ISDEBUG:
-                    logger.log(u"statement already prepared")
+            logger.log("building select statement... Quals: {0}, columns: {1}, sortkeys: {2}, limit: {3}, offset: {4}, allow filtering: {5}".format(quals, columns, sortkeys, limit, offset, self.allow_filtering))
+        # Planning is over, the next one starts from its own relations
+        self.unrestricted_planned = False
+        st = time.time()
+        max_rows = None
+        if limit is not None:
+            max_rows = limit + (offset or 0)
+        if self.snapshot and not self.query:
+            filtered_columns = self.snapshot_columns
+            result, exact = self.execute_snapshot(quals, sortkeys, max_rows)
+            if not exact:
+                max_rows = None
+        else:
+            plan = self.get_select_plan(quals, columns, self.allow_filtering, sortkeys=sortkeys, limited=max_rows is not None)
+            if plan is None:
+                yield {}
+                return
+            if not plan.enforced:
+                max_rows = None
+            # Cassandra can only stop early when the FDW drops no row
+            fetch_rows = max_rows
+            if not plan.exact:
+                fetch_rows = None
+            stmt = plan.statement
+            binding_values = plan.bind(quals, fetch_rows)
+            filtered_columns = plan.filtered_columns
+            if len(plan.fanout) > 0:
+                result = self.execute_fanout(plan, binding_values, fetch_rows)
+            elif self.is_token_range_scan(plan):
+                result = self.execute_token_range_scan(filtered_columns, fetch_rows)
+            else:
+                result = self.execute_select(stmt, binding_values, fetch_rows)
+            predicate = plan.build_predicate(quals)
+            if predicate is not None:
+                result = itertools.ifilter(predicate, result)
+            if len(plan.client_sort) > 0:
+                result = query_plan.sort_rows(result, plan.client_sort, max_rows)
+        if max_rows is not None:
+            result = itertools.islice(result, offset or 0, max_rows)
+        with_rowid = self.ROWIDCOLUMN in columns and all([c in filtered_columns for c in self.rowIdColumns])
+        columns_key = (tuple(filtered_columns), with_rowid)
+        decoder = self.row_decoders.get(columns_key, None)
+        if decoder is None:
+            rowid_encoder = None
+            if with_rowid:
+                rowid_encoder = self.get_rowid_encoder(filtered_columns)
+            decoder = row_decoders.RowDecoder(self.table_columns, filtered_columns, self.columnsTypes, self.ROWIDCOLUMN, rowid_encoder)
+            self.row_decoders[columns_key] = decoder
+        decode = decoder.decode
+        rowid_target = decoder.rowid_target
+        rows = 0
+        try:
+            for row in result:
+                rows += 1
+                line = decode(row)
+                if rowid_target is not None:
+                    self.remember_row(line[rowid_target], line, filtered_columns)
+                yield line
+        finally:
+            # Also reached when PostgreSQL stops the scan early
+            metrics.increment(self.metrics_scope, 'rows', rows)
+            metrics.observe_since(self.metrics_scope, 'scan', st)
+
+    def record_page(self, rows, wait, retries):
+        metrics.increment(self.metrics_scope, 'pages')
+        metrics.increment(self.metrics_scope, 'fetched_rows', rows)
+        metrics.observe(self.metrics_scope, 'page_wait', wait)
+        if retries > 0:
+            metrics.increment(self.metrics_scope, 'retries', retries)
+
+    def execute_select(self, stmt, binding_values, max_rows=None):
         if ISDEBUG:
             logger.log(u"executing statement...")
             st = time.time()
         elif self.enable_trace:
             logger.log(u"executing statement '{0}'".format(stmt))
+        fetch_size = self.fetch_size
+        if max_rows is not None:
+            fetch_size = max(1, min(fetch_size, max_rows))
         if self.prepare_select_stmt:
-            result = self.session.execute(self.prepared_select_stmts[stmt], binding_values)
+            statement = self.prepare(stmt).bind(binding_values)
+            statement.fetch_size = fetch_size
+            binding_values = None
         else:
-            result = self.session.execute(SimpleStatement(stmt), binding_values)
+            statement = SimpleStatement(stmt, fetch_size=fetch_size)
+        self.read_statement(statement)
+        if self.stream_pages:
+            result = result_pager.stream_rows(self.session, statement, binding_values, max_rows, self.record_page)
+        else:
+            result = result_pager.fetch_rows(self.session, statement, binding_values, max_rows, self.record_page)
         if ISDEBUG:
             logger.log(u"cursor got in {0} ms".format((time.time() - st) * 1000))
-        for row in result:
-            line = {}
-            idx = 0
-            for column_name in filtered_columns:
-                value = row[idx]
-                if self.columnsTypes[column_name].main_type == cassandra_types.cql_timestamp and value is not None:
-                    line[column_name] = u"{0}+00:00".format(value)
-                elif self.columnsTypes[column_name].main_type == cassandra_types.cql_time and value is not None:
-                    line[column_name] = u"{0}+00:00".format(value)
-                elif isinstance(value, tuple):
-                    tuple_values = []
-                    for t in value:
-                        tuple_values.append(str(t))
-                    line[column_name] = json.dumps(tuple_values)
-                elif isinstance(value, OrderedMapSerializedKey):
-                    dict_values = {}
-                    for i in value:
-                        dict_values[str(i)] = str(value[i])
-                    line[column_name] = json.dumps(dict_values)
-                else:
-                    line[column_name] = value
-                idx = idx + 1
-            rowid_values = []
-            for idcolumn in self.rowIdColumns:
-                rowid_values.append(unicode(line[idcolumn]))
-            line[self.ROWIDCOLUMN] = json.dumps(rowid_values)
-            yield line
+        return result
+
+    def execute_snapshot(self, quals, sortkeys=None, max_rows=None):
+        columns = self.snapshot_columns
+        snapshot = table_snapshot.get_snapshot(self.get_snapshot_key(), columns, len(self.partitionKeyColumns),
+                                               self.snapshot_refresh, self.snapshot_shared, self.load_snapshot_rows)
+        restrictions = self.get_snapshot_restrictions(quals)
+        checks = []
+        for column_name, qual_operator, value in restrictions:
+            if column_name in columns:
+                check = predicates.compile_check(columns.index(column_name), qual_operator, value, self.columnsTypes[column_name])
+                if check is not None:
+                    checks.append(check)
+        # PostgreSQL rechecks every qual, a LIMIT is only safe when all of them were applied here
+        exact = len(checks) == len(restrictions)
+        keys = self.get_snapshot_keys(restrictions)
+        if keys is None:
+            rows = snapshot.iterate_rows()
+        else:
+            rows = itertools.chain.from_iterable(itertools.imap(snapshot.get_partition, keys))
+        predicate = predicates.build_predicate(checks)
+        if predicate is not None:
+            rows = itertools.ifilter(predicate, rows)
+        if sortkeys:
+            rows = query_plan.sort_rows(rows, [(columns.index(k.attname), k.is_reversed) for k in sortkeys], max_rows if exact else None)
+        return rows, exact
+
+    def get_snapshot_key(self):
+        return (self.connection.key, self.keyspace, self.columnfamily)
+
+    def get_snapshot_restrictions(self, quals):
+        restrictions = []
+        for qual in quals:
+            if qual.field_name == self.ROWIDCOLUMN and qual.operator == "=" and qual.value is not None:
+                ids = self.decode_rowid(qual.value)
+                for i in range(0, len(self.rowIdColumns)):
+                    restrictions.append((self.rowIdColumns[i], "=", ids[i]))
+            else:
+                restrictions.append((qual.field_name, qual.operator, qual.value))
+        return restrictions
+
+    def get_snapshot_keys(self, restrictions):
+        # Partitions to look up when every partition key column is restricted by = or IN
+        key_values = {}
+        for column_name, qual_operator, value in restrictions:
+            if column_name not in self.partitionKeyColumns or column_name in key_values or value is None:
+                continue
+            if not predicates.is_comparable(self.columnsTypes[column_name]):
+                continue
+            if qual_operator == "=":
+                key_values[column_name] = [value]
+            elif qual_operator == (u"=", True):
+                key_values[column_name] = value
+        if len(key_values) < len(self.partitionKeyColumns):
+            return None
+        return itertools.product(*[query_plan.unique_values([predicates.normalize_value(v, self.columnsTypes[c]) for v in key_values[c] if v is not None])
+                                   for c in self.partitionKeyColumns])
+
+    def load_snapshot_rows(self):
+        if self.parallel_scan and token_ranges.is_supported(self.cluster.metadata.token_map):
+            return self.execute_token_range_scan(self.snapshot_columns)
+        stmt = u"SELECT {0} FROM {1}.{2}".format(u",".join(map(lambda c: '"{0}"'.format(c), self.snapshot_columns)), self.keyspace, self.columnfamily)
+        return self.execute_select(stmt, [])
+
+    def invalidate_snapshot(self):
+        if self.snapshot:
+            table_snapshot.invalidate(self.get_snapshot_key(), self.snapshot_shared)
+
+    def execute_fanout(self, plan, binding_values, max_rows=None):
+        # Requests are routed by the driver to a replica of their partition
+        if ISDEBUG:
+            logger.log(u"fan-out of {0} over IN lists, concurrency {1}".format(plan.statement, self.fanout_concurrency))
+        requests = self.get_fanout_requests(plan, binding_values, max_rows)
+        if len(plan.merge_keys) > 0:
+            return query_plan.merge_rows(result_pager.stream_partitions(self.session, requests, self.fanout_concurrency, self.record_page), plan.merge_keys)
+        return result_pager.stream_concurrent(self.session, requests, self.fanout_concurrency, max_rows, self.record_page)
+
+    def get_fanout_requests(self, plan, binding_values, max_rows):
+        prepared = self.prepare(plan.statement)
+        fetch_size = self.fetch_size
+        if max_rows is not None:
+            fetch_size = max(1, min(fetch_size, max_rows))
+        for values in query_plan.expand_fanout(binding_values, plan.fanout):
+            statement = self.read_statement(prepared.bind(values))
+            statement.fetch_size = fetch_size
+            yield (statement, None, None)
+
+    def build_token_range_stmt(self, filtered_columns):
+        token_fn = u"token({0})".format(u",".join(map(lambda c: '"{0}"'.format(c), self.partitionKeyColumns)))
+        stmt = u"SELECT {0} FROM {1}.{2} WHERE {3} > ? AND {3} <= ?".format(
+            u",".join(map(lambda c: '"{0}"'.format(c), filtered_columns)), self.keyspace, self.columnfamily, token_fn)
+        if self.allow_filtering:
+            stmt += u" ALLOW FILTERING"
+        return stmt
+
+    def is_token_range_scan(self, plan):
+        # Only unrestricted scans are split, a LIMIT can't be shared between ranges
+        if not self.parallel_scan or len(plan.binders) > 0 or self.query or self.limit:
+            return False
+        if not token_ranges.is_supported(self.cluster.metadata.token_map):
+            if ISDEBUG:
+                logger.log(u"token map is not available, falling back to a single scan")
+            return False
+        return True
+
+    def execute_token_range_scan(self, filtered_columns, max_rows=None):
+        token_map = self.cluster.metadata.token_map
+        prepared = self.prepare(self.build_token_range_stmt(filtered_columns))
+        splits = self.scan_splits
+        if splits <= 0:
+            splits = len(token_map.ring)
+        ranges = token_ranges.get_token_ranges(token_map, self.keyspace, splits)
+        if ISDEBUG:
+            logger.log(u"parallel scan of {0} token ranges, concurrency {1}".format(len(ranges), self.scan_concurrency))
+        requests = []
+        for i in range(0, len(ranges)):
+            start, end, replicas = ranges[i]
+            statement = self.read_statement(prepared.bind((start, end)))
+            statement.fetch_size = self.fetch_size
+            host = None
+            if len(replicas) > 0:
+                host = replicas[i % len(replicas)]
+            requests.append((statement, None, host))
+        return result_pager.stream_concurrent(self.session, requests, self.scan_concurrency, max_rows, self.record_page)
+
+    def can_sort(self, sortkeys):
+        # Only a prefix of the clustering key, read either in clustering
+        # order or entirely reversed, can be sorted by Cassandra. Rows of
+        # several partitions would be sorted in memory, PostgreSQL sorts
+        # them itself within work_mem
+        if self.query or self.unrestricted_planned:
+            return []
+        accepted = []
+        reversed_order = None
+        for i in range(0, min(len(sortkeys), len(self.clusteringKeyColumns))):
+            key = sortkeys[i]
+            if key.attname != self.clusteringKeyColumns[i]:
+                break
+            # text is compared bytewise by Cassandra
+            if self.columnsTypes[key.attname].main_type in (cassandra_types.cql_text, cassandra_types.cql_ascii) and key.collate not in ('C', 'POSIX'):
+                break
+            key_reversed = key.is_reversed != self.clusteringReversed[key.attname]
+            if reversed_order is not None and key_reversed != reversed_order:
+                break
+            reversed_order = key_reversed
+            accepted.append(key)
+        if ISDEBUG:
+            logger.log(u"sort keys {0}, accepted {1}".format(sortkeys, accepted))
+        return accepted
 
     def get_row_id_column(self):
         if ISDEBUG:
@@ -448,22 +1049,64 @@ class CassandraProvider:
         return self.ROWIDCOLUMN
 
     def get_rel_size(self, quals, columns):
-        rccol = 0
-        used_quals = []
+        width = table_stats.estimate_row_width(self.columnsTypes, columns, self.ROWIDCOLUMN)
+        restricted = {}
+        range_restricted = {}
+        index_used = False
+        key_restricted = set([q.field_name for q in quals if q.operator == "=" or q.operator == (u"=", True)])
+        if self.ROWIDCOLUMN not in key_restricted and not all([c in key_restricted for c in self.partitionKeyColumns]):
+            self.unrestricted_planned = True
         for q in quals:
-            if q.field_name in used_quals:
-                continue
-            used_quals.append(q.field_name)
             if q.field_name == self.ROWIDCOLUMN:
-                return (1, 100)
-            if q.field_name in self.rowIdColumns:
-                rccol += 1
-        if rccol == len(self.rowIdColumns):
-            return (1, 100)
-        elif rccol == 0:
-            return (100000, 100)
+                return (1, width)
+            if q.field_name in restricted:
+                continue
+            if q.operator == "=":
+                restricted[q.field_name] = 1
+            elif q.operator == (u"=", True):
+                if isinstance(q.value, (list, tuple)):
+                    restricted[q.field_name] = max(1, len(q.value))
+                else:
+                    restricted[q.field_name] = table_stats.IN_LIST_ESTIMATE
+            elif q.operator in (">", "<", ">=", "<="):
+                range_restricted[q.field_name] = True
+            if q.field_name in self.indexes:
+                index_used = True
+        stats = table_stats.get_table_stats(self.connection, self.keyspace, self.columnfamily, self.stats_ttl)
+        if not stats.is_available():
+            rccol = len([c for c in self.rowIdColumns if c in restricted or c in range_restricted])
+            if rccol == len(self.rowIdColumns):
+                return (1, width)
+            elif rccol == 0:
+                return (100000, width)
+            else:
+                return (10000, width)
+        full_width = table_stats.estimate_row_width(self.columnsTypes, self.columnsTypes.keys(), None) + table_stats.ROW_OVERHEAD
+        rows_per_partition = max(1.0, float(stats.mean_partition_size) / full_width)
+        if len([c for c in self.partitionKeyColumns if c in restricted]) == len(self.partitionKeyColumns):
+            partitions = 1
+            for c in self.partitionKeyColumns:
+                partitions *= restricted[c]
+            rows = rows_per_partition
+            for c in self.clusteringKeyColumns:
+                if c in restricted:
+                    rows *= restricted[c] * table_stats.CLUSTERING_EQ_SELECTIVITY
+                else:
+                    if c in range_restricted:
+                        rows *= table_stats.CLUSTERING_RANGE_SELECTIVITY
+                    break
+            else:
+                rows = 1
+                for c in self.clusteringKeyColumns:
+                    rows *= restricted[c]
+            rows = partitions * max(1.0, rows)
+        elif index_used:
+            rows = stats.partitions * rows_per_partition * table_stats.INDEX_SELECTIVITY
         else:
-            return (10000, 100)
+            rows = stats.partitions * rows_per_partition
+        if ISDEBUG:
+            logger.log(u"estimated {0} rows of {1} bytes".format(int(rows), width))
+        return (max(1, int(rows)), width)
 
     def get_path_keys(self):
         output = []
@@ -515,5 +1158,5 @@ class CassandraProvider:
         return output
 
     def close(self):
-        self.session.shutdown()
-        self.cluster.shutdown()
\ No newline at end of file
+        connection_pool.release(self.connection, self.pool_idle_timeout)
+        self.connection = None
\ No newline at end of file
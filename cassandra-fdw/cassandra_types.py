@@ -26,4 +26,6 @@ cql_ascii = 23
 class CqlType:
     def __init__(self, main_type, sub_types):
         self.main_type = main_type
+        self.encoder = None
+        self.json_writer = None
         self.sub_types = sub_types
\ No newline at end of file
@@ -0,0 +1,159 @@
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import TokenAwarePolicy, DCAwareRoundRobinPolicy, ConstantSpeculativeExecutionPolicy
+from cassandra.auth import PlainTextAuthProvider
+from cassandra.query import tuple_factory
+from statement_cache import PreparedStatementCache
+import atexit
+import time
+import logger
+import metrics
+import properties
+from logger import WARNING
+from properties import ISDEBUG
+
+SCHEMA_VERSION_QUERY = u"SELECT schema_version FROM system.local"
+
+# Process-wide pool shared by every foreign table of a backend
+_connections = {}
+
+
+class PooledConnection:
+
+    def __init__(self, key, cluster, session, statements_cache_size, lazy_schema):
+        self.key = key
+        self.cluster = cluster
+        self.session = session
+        self.statements = PreparedStatementCache(session, statements_cache_size)
+        self.references = 0
+        self.released_at = None
+        self.lazy_schema = lazy_schema
+        self.table_versions = {}
+
+    def get_schema_version(self):
+        try:
+            for row in self.session.execute(SCHEMA_VERSION_QUERY):
+                return row[0]
+        except Exception as e:
+            logger.log(u"schema version is not available: {0}".format(e), WARNING)
+        return None
+
+    def refresh_table(self, keyspace, table, schema_version):
+        # Without schema metadata the driver only knows the tables used by
+        # foreign tables, each one is fetched again when the schema changes
+        if not self.lazy_schema:
+            return
+        table_key = (keyspace, table)
+        if self.get_table_metadata(keyspace, table) is not None and (schema_version is None or self.table_versions.get(table_key, None) == schema_version):
+            return
+        if ISDEBUG:
+            logger.log(u"fetching metadata of {0}.{1}, schema version {2}".format(keyspace, table, schema_version))
+        # Refreshing a keyspace doesn't fetch its tables, but a table is only
+        # added to a keyspace the driver already knows
+        if keyspace not in self.cluster.metadata.keyspaces:
+            self.cluster.refresh_keyspace_metadata(keyspace)
+        self.cluster.refresh_table_metadata(keyspace, table)
+        if table not in self.cluster.metadata.keyspaces[keyspace].tables:
+            self.cluster.refresh_materialized_view_metadata(keyspace, table)
+        self.table_versions[table_key] = schema_version
+
+    def get_table_metadata(self, keyspace, table):
+        return self.statements.get_table_metadata(keyspace, table)
+
+    def is_idle(self, now, idle_timeout):
+        return self.references == 0 and self.released_at is not None and now - self.released_at >= idle_timeout
+
+    def shutdown(self):
+        self.session.shutdown()
+        self.cluster.shutdown()
+
+
+def get_pool_key(options):
+    hosts = tuple(sorted([h.strip() for h in options.get("hosts", "localhost").split(",")]))
+    return (hosts,
+            options.get("port", properties.DEFAULT_CASSANDRA_PORT),
+            options.get("username", None),
+            options.get("password", None),
+            options.get("connection_timeout", properties.DEFAULT_CONNECTION_TIMEOUT),
+            options.get("timeout", None),
+            options.get("local_dc", None),
+            options.get("token_aware", properties.TOKEN_AWARE_DEFAULT),
+            options.get("executor_threads", properties.DEFAULT_EXECUTOR_THREADS),
+            options.get("speculative_retry_delay", properties.DEFAULT_SPECULATIVE_RETRY_DELAY),
+            options.get("speculative_retry_attempts", properties.DEFAULT_SPECULATIVE_RETRY_ATTEMPTS),
+            options.get("lazy_schema_metadata", properties.LAZY_SCHEMA_METADATA_DEFAULT),
+            options.get("prepared_cache_size", properties.DEFAULT_PREPARED_CACHE_SIZE))
+
+
+def build_execution_profile(timeout, local_dc, token_aware, speculative_retry_delay, speculative_retry_attempts):
+    # Rows are decoded positionally, see row_decoders
+    profile = ExecutionProfile(row_factory=tuple_factory)
+    if timeout is not None:
+        profile.request_timeout = float(timeout)
+    load_balancing_policy = DCAwareRoundRobinPolicy(local_dc=local_dc)
+    if token_aware == 'True':
+        load_balancing_policy = TokenAwarePolicy(load_balancing_policy)
+    profile.load_balancing_policy = load_balancing_policy
+    # Only applies to statements flagged as idempotent, i.e. reads
+    if float(speculative_retry_delay) > 0:
+        profile.speculative_execution_policy = ConstantSpeculativeExecutionPolicy(
+            float(speculative_retry_delay) / 1000, int(speculative_retry_attempts))
+    return profile
+
+
+def connect(key):
+    start_time = time.time()
+    hosts, port, username, password, connection_timeout, timeout, local_dc, token_aware, executor_threads, \
+        speculative_retry_delay, speculative_retry_attempts, lazy_schema_metadata, prepared_cache_size = key
+    lazy_schema = lazy_schema_metadata == 'True'
+    profile = build_execution_profile(timeout, local_dc, token_aware, speculative_retry_delay, speculative_retry_attempts)
+    cluster = Cluster(list(hosts), port=int(port), execution_profiles={EXEC_PROFILE_DEFAULT: profile},
+                      executor_threads=int(executor_threads), connect_timeout=int(connection_timeout),
+                      schema_metadata_enabled=not lazy_schema)
+    if(username is not None):
+        cluster.auth_provider = PlainTextAuthProvider(username=username, password=password)
+    session = cluster.connect()
+    metrics.observe_since(metrics.GLOBAL_SCOPE, 'connect', start_time)
+    if ISDEBUG:
+        logger.log("connected in {0} ms".format(int((time.time() - start_time) * 1000)))
+    return PooledConnection(key, cluster, session, int(prepared_cache_size), lazy_schema)
+
+
+def acquire(options):
+    idle_timeout = float(options.get("pool_idle_timeout", properties.DEFAULT_POOL_IDLE_TIMEOUT))
+    evict_idle(idle_timeout)
+    key = get_pool_key(options)
+    connection = _connections.get(key)
+    if connection is None:
+        connection = connect(key)
+        _connections[key] = connection
+    elif ISDEBUG:
+        logger.log("reusing pooled connection, references: {0}".format(connection.references))
+    connection.references += 1
+    connection.released_at = None
+    return connection
+
+
+def release(connection, idle_timeout):
+    connection.references -= 1
+    if connection.references <= 0:
+        connection.references = 0
+        connection.released_at = time.time()
+    evict_idle(idle_timeout)
+
+
+def evict_idle(idle_timeout):
+    now = time.time()
+    for key, connection in _connections.items():
+        if connection.is_idle(now, idle_timeout):
+            if ISDEBUG:
+                logger.log("closing idle pooled connection to {0}".format(",".join(key[0])))
+            del _connections[key]
+            connection.shutdown()
+
+
+def shutdown_all():
+    for key, connection in _connections.items():
+        del _connections[key]
+        connection.shutdown()
+
+atexit.register(shutdown_all)
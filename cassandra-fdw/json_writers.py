@@ -0,0 +1,101 @@
+from json.encoder import encode_basestring_ascii
+import binascii
+import math
+import cassandra_types
+
+# Writers turn a driver value straight into JSON text following the CQL type,
+# numbers and booleans stay JSON numbers and booleans. Output is ASCII only.
+NULL = 'null'
+
+
+def get_json_writer(cql_type):
+    # Writers are compiled once per CqlType and reused for every value
+    if cql_type.json_writer is None:
+        cql_type.json_writer = compile_json_writer(cql_type)
+    return cql_type.json_writer
+
+
+def compile_json_writer(cql_type):
+    main_type = cql_type.main_type
+    if main_type == cassandra_types.cql_map:
+        return compile_map_writer(compile_key_writer(cql_type.sub_types[0]), get_json_writer(cql_type.sub_types[1]))
+    elif main_type == cassandra_types.cql_tuple:
+        return compile_tuple_writer([get_json_writer(t) for t in cql_type.sub_types])
+    elif main_type in (cassandra_types.cql_list, cassandra_types.cql_set):
+        return compile_list_writer(get_json_writer(cql_type.sub_types[0]))
+    return SCALAR_WRITERS.get(main_type, write_string)
+
+
+def compile_key_writer(cql_type):
+    # JSON object keys must be strings, other keys are quoted
+    writer = get_json_writer(cql_type)
+    if cql_type.main_type in STRING_TYPES:
+        return writer
+    return lambda value: encode_basestring_ascii(writer(value))
+
+
+def compile_map_writer(key_writer, value_writer):
+    def write(value):
+        return '{' + ','.join([key_writer(k) + ':' + (NULL if v is None else value_writer(v)) for k, v in value.items()]) + '}'
+    return write
+
+
+def compile_tuple_writer(writers):
+    positions = range(0, len(writers))
+    def write(value):
+        return '[' + ','.join([NULL if value[i] is None else writers[i](value[i]) for i in positions]) + ']'
+    return write
+
+
+def compile_list_writer(writer):
+    def write(value):
+        return '[' + ','.join([NULL if v is None else writer(v) for v in value]) + ']'
+    return write
+
+
+def write_float(value):
+    # NaN and infinity are not JSON numbers
+    if math.isnan(value) or math.isinf(value):
+        return '"' + repr(value) + '"'
+    return repr(value)
+
+
+def write_decimal(value):
+    if not value.is_finite():
+        return '"' + str(value) + '"'
+    return str(value)
+
+
+def write_boolean(value):
+    return 'true' if value else 'false'
+
+
+def write_blob(value):
+    return '"0x' + binascii.hexlify(value) + '"'
+
+
+def write_string(value):
+    return encode_basestring_ascii(unicode(value))
+
+
+# Text and integers go through builtins, no wrapper call per value
+SCALAR_WRITERS = {
+    cassandra_types.cql_ascii: encode_basestring_ascii,
+    cassandra_types.cql_text: encode_basestring_ascii,
+    cassandra_types.cql_bigint: str,
+    cassandra_types.cql_counter: str,
+    cassandra_types.cql_int: str,
+    cassandra_types.cql_smallint: str,
+    cassandra_types.cql_tinyint: str,
+    cassandra_types.cql_varint: str,
+    cassandra_types.cql_double: write_float,
+    cassandra_types.cql_float: write_float,
+    cassandra_types.cql_decimal: write_decimal,
+    cassandra_types.cql_boolean: write_boolean,
+    cassandra_types.cql_blob: write_blob
+}
+STRING_TYPES = frozenset([
+    cassandra_types.cql_ascii, cassandra_types.cql_blob, cassandra_types.cql_date, cassandra_types.cql_inet,
+    cassandra_types.cql_text, cassandra_types.cql_time, cassandra_types.cql_timestamp, cassandra_types.cql_timeuuid,
+    cassandra_types.cql_uuid
+])
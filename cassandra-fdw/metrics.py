@@ -0,0 +1,85 @@
+import json
+import time
+
+# Power of two buckets of microseconds, the last one holds everything above ~35 minutes
+HISTOGRAM_BUCKETS = 32
+GLOBAL_SCOPE = u"*"
+
+# Process-wide, every backend has its own metrics
+_counters = {}
+_histograms = {}
+
+
+class Histogram:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1000000).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the value, at most twice the real one
+        wanted = self.count * fraction
+        seen = 0
+        for bucket in range(0, HISTOGRAM_BUCKETS):
+            seen += self.buckets[bucket]
+            if seen >= wanted and seen > 0:
+                return min(float(2 ** bucket) / 1000000, self.max)
+        return self.max
+
+
+def increment(scope, name, amount=1):
+    key = (scope, name)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(scope, name, seconds):
+    key = (scope, name)
+    histogram = _histograms.get(key, None)
+    if histogram is None:
+        histogram = Histogram()
+        _histograms[key] = histogram
+    histogram.add(seconds)
+
+
+def observe_since(scope, name, start_time):
+    observe(scope, name, time.time() - start_time)
+
+
+def get_rows(rowid_column):
+    rows = []
+    for key, value in sorted(_counters.items()):
+        rows.append({
+            'table_name': key[0],
+            'metric': key[1],
+            'count': value,
+            rowid_column: json.dumps(key)
+        })
+    for key, histogram in sorted(_histograms.items()):
+        rows.append({
+            'table_name': key[0],
+            'metric': key[1],
+            'count': histogram.count,
+            'total_ms': histogram.total * 1000,
+            'mean_ms': histogram.total * 1000 / histogram.count,
+            'p50_ms': histogram.percentile(0.5) * 1000,
+            'p95_ms': histogram.percentile(0.95) * 1000,
+            'p99_ms': histogram.percentile(0.99) * 1000,
+            'max_ms': histogram.max * 1000,
+            rowid_column: json.dumps(key)
+        })
+    return rows
+
+
+def reset(rowid):
+    key = tuple(json.loads(rowid))
+    _counters.pop(key, None)
+    _histograms.pop(key, None)
@@ -0,0 +1,48 @@
+from cassandra.query import BatchStatement, BatchType
+from collections import OrderedDict
+
+
+def group_unlogged_batches(statements_and_params, batch_size, consistency_level=None, counter=False, batch_max_bytes=None):
+    # Statements sharing a routing key hit the same partition, so an
+    # UNLOGGED batch of them is applied by one replica set in one request
+    partitions = OrderedDict()
+    for bound, params in statements_and_params:
+        partitions.setdefault(bound.routing_key, []).append(bound)
+    batches = []
+    for bounds in partitions.values():
+        for chunk in split_chunks(bounds, batch_size, batch_max_bytes):
+            if len(chunk) == 1:
+                batches.append((chunk[0], None))
+                continue
+            # Counter tables only take counter batches
+            batch = BatchStatement(batch_type=BatchType.COUNTER if counter else BatchType.UNLOGGED)
+            if consistency_level is not None:
+                batch.consistency_level = consistency_level
+            for bound in chunk:
+                batch.add(bound)
+            batches.append((batch, None))
+    return batches
+
+
+def split_chunks(bounds, batch_size, batch_max_bytes):
+    # Cassandra rejects batches over batch_size_fail_threshold_in_kb (50 KB
+    # by default), a chunk ends before its values would exceed batch_max_bytes
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for bound in bounds:
+        size = get_values_size(bound)
+        if len(chunk) > 0 and (len(chunk) >= batch_size or (batch_max_bytes is not None and chunk_bytes + size > batch_max_bytes)):
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(bound)
+        chunk_bytes += size
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+def get_values_size(bound):
+    # Bound values are already serialized by the driver, NULL and unset are None or UNSET_VALUE
+    return sum([len(v) for v in bound.values if isinstance(v, (str, bytearray))])
@@ -0,0 +1,113 @@
+from datetime import datetime
+from decimal import Decimal
+import operator
+import pytz
+import cassandra_types
+import types_mapper
+
+# Driver values of these types are equal in Python when PostgreSQL finds them
+# equal. Doubles are left out, NaN is equal to itself in PostgreSQL only
+COMPARABLE_TYPES = set([
+    cassandra_types.cql_bigint,
+    cassandra_types.cql_boolean,
+    cassandra_types.cql_counter,
+    cassandra_types.cql_decimal,
+    cassandra_types.cql_int,
+    cassandra_types.cql_smallint,
+    cassandra_types.cql_text,
+    cassandra_types.cql_timestamp,
+    cassandra_types.cql_timeuuid,
+    cassandra_types.cql_tinyint,
+    cassandra_types.cql_uuid,
+    cassandra_types.cql_varint
+])
+# And ordered the same way. Text follows the column collation in PostgreSQL,
+# not code points, and a NaN numeric is greater than any number
+ORDERED_TYPES = COMPARABLE_TYPES - set([cassandra_types.cql_text, cassandra_types.cql_decimal])
+EQUALITY_OPERATORS = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "!=": operator.ne
+}
+OPERATORS = dict(EQUALITY_OPERATORS, **{
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+})
+
+
+def is_comparable(cql_type):
+    return cql_type.main_type in COMPARABLE_TYPES
+
+
+def is_exact(qual_operator, cql_type):
+    # True when the check of this qual keeps exactly the rows PostgreSQL keeps
+    if qual_operator == (u"=", True) or qual_operator in EQUALITY_OPERATORS:
+        return cql_type.main_type in COMPARABLE_TYPES
+    return qual_operator in OPERATORS and cql_type.main_type in ORDERED_TYPES
+
+
+def normalize_value(value, cql_type):
+    # Brings a PostgreSQL value to the form the driver returns for the column
+    value = types_mapper.map_object_to_type(value, cql_type)
+    if isinstance(value, str):
+        return value.decode('utf8')
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(pytz.utc).replace(tzinfo=None)
+    return value
+
+
+def compile_check(idx, qual_operator, value, cql_type):
+    # None when the restriction can't be evaluated on driver values,
+    # PostgreSQL checks it anyway
+    if not is_exact(qual_operator, cql_type):
+        return None
+    if qual_operator == (u"=", True):
+        values = frozenset([v for v in [normalize_value(v, cql_type) for v in value if v is not None] if not is_nan(v)])
+        return in_check(idx, values)
+    if value is None:
+        if qual_operator == "=":
+            return null_check(idx, True)
+        if qual_operator in ("<>", "!="):
+            return null_check(idx, False)
+        return None
+    return compare_check(idx, OPERATORS[qual_operator], normalize_value(value, cql_type))
+
+
+def is_nan(value):
+    # Cassandra decimals are never NaN, nothing matches one
+    return isinstance(value, Decimal) and value.is_nan()
+
+
+def compare_check(idx, compare, value):
+    def check(row):
+        row_value = row[idx]
+        return row_value is not None and compare(row_value, value)
+    return check
+
+
+def in_check(idx, values):
+    def check(row):
+        return row[idx] in values
+    return check
+
+
+def null_check(idx, is_null):
+    def check(row):
+        return (row[idx] is None) == is_null
+    return check
+
+
+def build_predicate(checks):
+    if len(checks) == 0:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def predicate(row):
+        for check in checks:
+            if not check(row):
+                return False
+        return True
+    return predicate
@@ -4,7 +4,35 @@ DEFAULT_CASSANDRA_PORT = '9042'
 ENABLE_TRACE_STATEMENTS_DEFAULT = 'False'
 ALLOW_FILTERING_DEFAULT = 'False'
 DEFAULT_CONNECTION_TIMEOUT = '2'
-PREPARE_SELECTS_DEFAULT = 'False'
+PREPARE_SELECTS_DEFAULT = 'True'
 PER_TRANSACTION_CONNECTION = 'False'
 BATCH_MODIFY_THRESHOLD = 10000
-DEFAULT_TTL = '0'
\ No newline at end of file
+DEFAULT_TTL = '0'
+DEFAULT_POOL_IDLE_TIMEOUT = '600'
+DEFAULT_FETCH_SIZE = '5000'
+STREAM_PAGES_DEFAULT = 'False'
+PARALLEL_SCAN_DEFAULT = 'False'
+DEFAULT_SCAN_SPLITS = '0'
+DEFAULT_SCAN_CONCURRENCY = '8'
+DEFAULT_PREPARED_CACHE_SIZE = '1000'
+SELECT_PLAN_CACHE_SIZE = 256
+RECENT_ROWS_CACHE_SIZE = 1000
+DEFAULT_STATS_TTL = '300'
+DEFAULT_MODIFY_MODE = 'concurrent'
+DEFAULT_BATCH_SIZE = '100'
+DEFAULT_BATCH_MAX_BYTES = '40000'
+DEFAULT_MAX_IN_FLIGHT = '128'
+TOKEN_AWARE_DEFAULT = 'True'
+DEFAULT_EXECUTOR_THREADS = '4'
+DEFAULT_SPECULATIVE_RETRY_DELAY = '0'
+DEFAULT_SPECULATIVE_RETRY_ATTEMPTS = '2'
+IN_FANOUT_DEFAULT = 'False'
+DEFAULT_FANOUT_CONCURRENCY = '32'
+SNAPSHOT_DEFAULT = 'False'
+DEFAULT_SNAPSHOT_REFRESH = '300'
+SNAPSHOT_SHARED_DEFAULT = 'False'
+LAZY_SCHEMA_METADATA_DEFAULT = 'True'
+DEFAULT_SCHEMA_CHECK_INTERVAL = '10'
+SCHEMA_CACHE_SHARED_DEFAULT = 'False'
+STATS_TABLE_DEFAULT = 'False'
+DEFAULT_NULL_INSERT_MODE = 'bind'
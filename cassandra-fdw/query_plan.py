@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import operator
+import predicates
+from cassandra.query import ValueSequence
+
+
+class SelectPlan:
+
+    def __init__(self, statement, filtered_columns, binders, client_sort, exact, fanout=None, merge_keys=None, residual=None, enforced=None):
+        self.statement = statement
+        self.filtered_columns = filtered_columns
+        self.binders = binders
+        self.client_sort = client_sort
+        # True when Cassandra enforces every qual exactly
+        self.exact = exact
+        # Binding positions holding partition key IN lists, one query is sent per combination
+        self.fanout = fanout or []
+        self.merge_keys = merge_keys or []
+        # (qual index, row position, type) of the quals checked by the FDW
+        self.residual = residual or []
+        # True when every qual is enforced by Cassandra or by the residual checks
+        self.enforced = exact if enforced is None else enforced
+
+    def bind(self, quals, limit=None):
+        binding_values = []
+        for binder in self.binders:
+            binder(quals, binding_values, limit)
+        return binding_values
+
+    def build_predicate(self, quals):
+        # Residual quals were chosen by operator, type and NULL value, all part
+        # of the plan shape, so each one compiles to a check
+        return predicates.build_predicate([predicates.compile_check(position, quals[idx].operator, quals[idx].value, cql_type)
+                                           for idx, position, cql_type in self.residual])
+
+
+def get_shape(quals, columns, allow_filtering, sortkeys=None, limited=False):
+    # Everything the CQL text depends on, values only matter when they are NULL
+    return (tuple([(q.field_name, q.operator, q.value is None) for q in quals]), tuple(columns), allow_filtering,
+            tuple([(k.attname, k.is_reversed) for k in sortkeys or []]), limited)
+
+
+def sort_rows(rows, client_sort, limit=None):
+    if limit is not None:
+        # Only the first rows are kept in memory, nsmallest is stable
+        return heapq.nsmallest(limit, rows, key=compile_sort_key(client_sort))
+    rows = list(rows)
+    # Stable sorts from the last key to the first one
+    for idx, is_reversed in reversed(client_sort):
+        rows.sort(key=operator.itemgetter(idx), reverse=is_reversed)
+    return rows
+
+
+class Descending(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def compile_sort_key(sort_keys):
+    def get_key(row):
+        return tuple([Descending(row[idx]) if is_reversed else row[idx] for idx, is_reversed in sort_keys])
+    return get_key
+
+
+def merge_rows(streams, merge_keys):
+    # k-way merge of partitions that are each already in order, heapq.merge
+    # has no key argument in python 2
+    get_key = compile_sort_key(merge_keys)
+    heap = []
+    for i in range(0, len(streams)):
+        row = next(streams[i], None)
+        if row is not None:
+            heap.append((get_key(row), i, row))
+    heapq.heapify(heap)
+    while heap:
+        key, i, row = heap[0]
+        yield row
+        row = next(streams[i], None)
+        if row is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (get_key(row), i, row))
+
+
+def expand_fanout(binding_values, positions):
+    # Cartesian product of the IN lists, one set of values per partition
+    for combination in itertools.product(*[unique_values(binding_values[p]) for p in positions]):
+        values = list(binding_values)
+        for i in range(0, len(positions)):
+            values[positions[i]] = combination[i]
+        yield values
+
+
+def unique_values(values):
+    # IN ignores duplicates, separate queries would return the partition twice
+    seen = set()
+    unique = []
+    for value in values:
+        try:
+            if value in seen:
+                continue
+            seen.add(value)
+        except TypeError:
+            pass
+        unique.append(value)
+    return unique
+
+
+def value_binder(idx, encode):
+    def bind(quals, binding_values, limit):
+        binding_values.append(encode(quals[idx].value))
+    return bind
+
+
+def list_binder(idx, encode, prepared):
+    def bind(quals, binding_values, limit):
+        values = [encode(el) for el in quals[idx].value]
+        if prepared:
+            binding_values.append(values)
+        else:
+            binding_values.append(ValueSequence(values))
+    return bind
+
+
+def like_binder(idx, encode, contains):
+    def bind(quals, binding_values, limit):
+        if contains:
+            binding_values.append(encode(u"%{0}%".format(quals[idx].value)))
+        else:
+            binding_values.append(encode(quals[idx].value))
+    return bind
+
+
+def rowid_binder(idx, decode_rowid):
+    def bind(quals, binding_values, limit):
+        binding_values.extend(decode_rowid(quals[idx].value))
+    return bind
+
+
+def limit_binder(static_limit):
+    def bind(quals, binding_values, limit):
+        if static_limit:
+            limit = min(limit, int(static_limit))
+        binding_values.append(limit)
+    return bind
@@ -0,0 +1,115 @@
+from collections import deque
+import time
+
+
+def execute_async(session, statement, parameters=None, paging_state=None, host=None):
+    if host is not None:
+        return session.execute_async(statement, parameters, paging_state=paging_state, host=host)
+    return session.execute_async(statement, parameters, paging_state=paging_state)
+
+
+def wait_page(future, on_page):
+    # on_page gets the page size, the time spent blocked on Cassandra and
+    # the number of extra hosts tried (retries and speculative executions)
+    if on_page is None:
+        return future.result()
+    st = time.time()
+    result = future.result()
+    on_page(len(result.current_rows), time.time() - st, max(0, len(getattr(future, 'attempted_hosts', ())) - 1))
+    return result
+
+
+def fetch_rows(session, statement, parameters=None, max_rows=None, on_page=None):
+    # Pages are requested one at a time, when the previous one is consumed
+    paging_state = None
+    fetched = 0
+    while True:
+        result = wait_page(execute_async(session, statement, parameters, paging_state), on_page)
+        fetched += len(result.current_rows)
+        for row in result.current_rows:
+            yield row
+        paging_state = result.paging_state
+        if paging_state is None or (max_rows is not None and fetched >= max_rows):
+            return
+
+
+def stream_rows(session, statement, parameters=None, max_rows=None, on_page=None):
+    future = execute_async(session, statement, parameters)
+    return iterate_pages(session, statement, parameters, future, max_rows, on_page)
+
+
+def iterate_pages(session, statement, parameters, future, max_rows, on_page=None):
+    # The next page is requested before the current one is handed out,
+    # so the network round trip overlaps with row conversion
+    fetched = 0
+    while future is not None:
+        result = wait_page(future, on_page)
+        paging_state = result.paging_state
+        fetched += len(result.current_rows)
+        if paging_state is not None and (max_rows is None or fetched < max_rows):
+            future = execute_async(session, statement, parameters, paging_state)
+        else:
+            future = None
+        for row in result.current_rows:
+            yield row
+
+
+def stream_partitions(session, requests, concurrency, on_page=None):
+    # An ordered merge needs the first page of every partition before it can
+    # return anything, following pages are only fetched when reached
+    pending = deque()
+    streams = []
+    for statement, parameters, host in requests:
+        if len(pending) >= concurrency:
+            streams.append(resume_pages(session, on_page, *pending.popleft()))
+        pending.append((statement, parameters, host, execute_async(session, statement, parameters, None, host)))
+    while pending:
+        streams.append(resume_pages(session, on_page, *pending.popleft()))
+    return streams
+
+
+def resume_pages(session, on_page, statement, parameters, host, future):
+    return iterate_remaining_pages(session, statement, parameters, host, wait_page(future, on_page), on_page)
+
+
+def iterate_remaining_pages(session, statement, parameters, host, result, on_page=None):
+    while True:
+        for row in result.current_rows:
+            yield row
+        if result.paging_state is None:
+            return
+        result = wait_page(execute_async(session, statement, parameters, result.paging_state, host), on_page)
+
+
+def stream_concurrent(session, requests, concurrency, max_rows=None, on_page=None):
+    requests = iter(requests)
+    active = deque()
+    for i in range(0, concurrency):
+        if not start_next_request(session, requests, active):
+            break
+    return iterate_concurrent_pages(session, requests, active, max_rows, on_page)
+
+
+def start_next_request(session, requests, active):
+    for statement, parameters, host in requests:
+        active.append((statement, parameters, host, execute_async(session, statement, parameters, None, host)))
+        return True
+    return False
+
+
+def iterate_concurrent_pages(session, requests, active, max_rows, on_page=None):
+    # Pages are consumed round robin while up to `concurrency` requests
+    # (one per token range or partition) are in flight
+    fetched = 0
+    while active:
+        statement, parameters, host, future = active.popleft()
+        result = wait_page(future, on_page)
+        paging_state = result.paging_state
+        fetched += len(result.current_rows)
+        wanted = max_rows is None or fetched < max_rows
+        if paging_state is not None and wanted:
+            active.append((statement, parameters, host, execute_async(session, statement, parameters, paging_state, host)))
+        elif wanted:
+            start_next_request(session, requests, active)
+        for row in result.current_rows:
+            yield row
@@ -0,0 +1,49 @@
+import cassandra_types
+import json_writers
+import time_utils
+
+
+def get_converter(cql_type):
+    # None means the driver value is handed to PostgreSQL as is,
+    # maps and tuples become json columns
+    if cql_type.main_type in (cassandra_types.cql_tuple, cassandra_types.cql_map):
+        return json_writers.get_json_writer(cql_type)
+    return {
+        cassandra_types.cql_timestamp: time_utils.from_cassandra_timestamp,
+        cassandra_types.cql_time: time_utils.from_cassandra_time
+    }.get(cql_type.main_type, None)
+
+
+class RowDecoder:
+
+    def __init__(self, table_columns, filtered_columns, columns_types, rowid_column, rowid_encoder):
+        self.width = len(table_columns)
+        target = dict((table_columns[i], i) for i in range(0, self.width))
+        self.identity_steps = []
+        self.convert_steps = []
+        for src in range(0, len(filtered_columns)):
+            column_name = filtered_columns[src]
+            converter = get_converter(columns_types[column_name])
+            if column_name not in target:
+                continue
+            if converter is None:
+                self.identity_steps.append((src, target[column_name]))
+            else:
+                self.convert_steps.append((src, target[column_name], converter))
+        # rowid_encoder is None unless the rowid was requested, it works on the raw driver values
+        self.rowid_target = None
+        self.rowid_encoder = rowid_encoder
+        if rowid_encoder is not None:
+            self.rowid_target = target[rowid_column]
+
+    def decode(self, row):
+        line = [None] * self.width
+        for src, dst in self.identity_steps:
+            line[dst] = row[src]
+        for src, dst, converter in self.convert_steps:
+            value = row[src]
+            if value is not None:
+                line[dst] = converter(value)
+        if self.rowid_target is not None:
+            line[self.rowid_target] = self.rowid_encoder(row)
+        return line
@@ -0,0 +1,33 @@
+import base64
+import struct
+
+# A rowid is the base64 of the driver-serialized primary key values, each one
+# prefixed by its length, so it is decoded back without any text parsing
+LENGTH = struct.Struct('>H')
+
+
+def compile_rowid_encoder(cql_types, positions, protocol_version):
+    steps = zip(positions, [t.serialize for t in cql_types])
+    pack = LENGTH.pack
+    def encode(row):
+        parts = []
+        for src, serialize in steps:
+            data = serialize(row[src], protocol_version)
+            parts.append(pack(len(data)))
+            parts.append(data)
+        return base64.b64encode(''.join(parts))
+    return encode
+
+
+def decode_rowid(rowid, cql_types, protocol_version):
+    data = base64.b64decode(rowid)
+    values = []
+    offset = 0
+    for cql_type in cql_types:
+        length = LENGTH.unpack_from(data, offset)[0]
+        offset += LENGTH.size
+        values.append(cql_type.deserialize(data[offset:offset + length], protocol_version))
+        offset += length
+    if offset != len(data):
+        raise ValueError('invalid rowid')
+    return values
@@ -0,0 +1,39 @@
+import errno
+import hashlib
+import os
+import stat
+import tempfile
+import logger
+from logger import WARNING
+
+# Files shared by the backends of a host live in a directory private to the
+# server user. Their names are derived from what they hold, never taken from
+# a table option, so no option can make a backend replace or remove a file
+DIRECTORY = os.path.join(tempfile.gettempdir(), 'cassandra_fdw-{0}'.format(os.getuid()))
+
+
+def get_path(name):
+    # None when the directory can't be used, the caller keeps its data in memory
+    try:
+        try:
+            os.mkdir(DIRECTORY, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        check_owner(DIRECTORY, os.lstat(DIRECTORY))
+    except Exception as e:
+        logger.log(u"can't use directory {0}: {1}".format(DIRECTORY, e), WARNING)
+        return None
+    return os.path.join(DIRECTORY, name)
+
+
+def get_key_name(key, suffix):
+    return hashlib.sha1(repr(key)).hexdigest() + suffix
+
+
+def check_owner(path, st):
+    # Only files of the server user, that no other user can change, are trusted
+    if st.st_uid != os.getuid():
+        raise ValueError('{0} is not owned by the server user'.format(path))
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ValueError('{0} is writable by other users'.format(path))
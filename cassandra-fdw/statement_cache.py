@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import re
+import time
+import logger
+import metrics
+from properties import ISDEBUG
+
+# Whitespace outside of string literals doesn't change the statement
+WHITESPACE_RE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def normalize_statement(query):
+    return WHITESPACE_RE.sub(lambda m: m.group(1) or u" ", query).strip()
+
+
+class PreparedStatementCache:
+
+    def __init__(self, session, max_size):
+        self.session = session
+        self.max_size = max_size
+        self.statements = OrderedDict()
+        self.normalized = {}
+        self.tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    def prepare(self, query, keyspace, table):
+        self.check_schema(keyspace, table)
+        key = self.normalized.get(query, None)
+        if key is None:
+            if len(self.normalized) >= self.max_size * 4:
+                self.normalized.clear()
+            key = normalize_statement(query)
+            self.normalized[query] = key
+        entry = self.statements.pop(key, None)
+        scope = u"{0}.{1}".format(keyspace, table)
+        if entry is None:
+            self.misses += 1
+            metrics.increment(scope, 'prepare_misses')
+            if ISDEBUG:
+                logger.log(u"preparing statement: {0}".format(key))
+            st = time.time()
+            entry = (self.session.prepare(query), (keyspace, table))
+            metrics.observe_since(scope, 'prepare', st)
+            if len(self.statements) >= self.max_size:
+                self.statements.popitem(last=False)
+        else:
+            self.hits += 1
+            metrics.increment(scope, 'prepare_hits')
+        # Most recently used statements are kept at the end
+        self.statements[key] = entry
+        return entry[0]
+
+    def check_schema(self, keyspace, table):
+        # The driver replaces the table metadata object when the table is
+        # refreshed, on a schema change event or by the connection in lazy
+        # schema mode, statements prepared against the old one are dropped
+        table_key = (keyspace, table)
+        metadata = self.get_table_metadata(keyspace, table)
+        if self.tables.get(table_key, None) is not metadata:
+            if table_key in self.tables:
+                self.invalidate(keyspace, table)
+            self.tables[table_key] = metadata
+
+    def get_table_metadata(self, keyspace, table):
+        keyspace_metadata = self.session.cluster.metadata.keyspaces.get(keyspace, None)
+        if keyspace_metadata is None:
+            return None
+        if table in keyspace_metadata.tables:
+            return keyspace_metadata.tables[table]
+        return keyspace_metadata.views.get(table, None)
+
+    def invalidate(self, keyspace, table):
+        table_key = (keyspace, table)
+        if ISDEBUG:
+            logger.log(u"schema of {0}.{1} changed, dropping prepared statements".format(keyspace, table))
+        for key, entry in self.statements.items():
+            if entry[1] == table_key:
+                del self.statements[key]
@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import logger
+import shared_files
+import types_mapper
+from logger import WARNING
+from properties import ISDEBUG
+
+# Process-wide, (connection key, keyspace, table) -> (schema version, descriptor)
+_descriptors = {}
+# Descriptor cache files already read by this process
+_files = {}
+# One file for every table, in the directory of shared_files
+CACHE_FILE_NAME = 'descriptors.json'
+
+
+class TableDescriptor:
+
+    def __init__(self, columns, validators, queryableColumns, querableColumnsIdx, indexes, rowIdColumns,
+                 partitionKeyColumns, clusteringKeyColumns, clusteringReversed):
+        self.columns = columns
+        self.validators = validators
+        self.queryableColumns = queryableColumns
+        self.querableColumnsIdx = querableColumnsIdx
+        self.indexes = indexes
+        self.rowIdColumns = rowIdColumns
+        self.partitionKeyColumns = partitionKeyColumns
+        self.clusteringKeyColumns = clusteringKeyColumns
+        self.clusteringReversed = clusteringReversed
+        self.columnsTypes = dict([(c, types_mapper.get_cql_type_from_validator(validators[c])) for c in columns])
+
+    def to_json(self):
+        return {
+            'columns': self.columns,
+            'validators': self.validators,
+            'queryableColumns': self.queryableColumns,
+            'querableColumnsIdx': self.querableColumnsIdx,
+            'indexes': self.indexes,
+            'rowIdColumns': self.rowIdColumns,
+            'partitionKeyColumns': self.partitionKeyColumns,
+            'clusteringKeyColumns': self.clusteringKeyColumns,
+            'clusteringReversed': self.clusteringReversed
+        }
+
+
+def from_json(data):
+    return TableDescriptor(data['columns'], data['validators'], data['queryableColumns'], data['querableColumnsIdx'],
+                           data['indexes'], data['rowIdColumns'], data['partitionKeyColumns'],
+                           data['clusteringKeyColumns'], data['clusteringReversed'])
+
+
+def get_descriptor(connection, keyspace, table, schema_version, shared, build):
+    # Descriptors are only trusted for the schema version they were built from
+    key = (connection.key, keyspace, table)
+    cached = _descriptors.get(key, None)
+    if cached is not None and schema_version is not None and cached[0] == schema_version:
+        return cached[1]
+    descriptor = None
+    path = shared_files.get_path(CACHE_FILE_NAME) if shared else None
+    file_key = u"{0}:{1}/{2}.{3}".format(u",".join(connection.key[0]), connection.key[1], keyspace, table)
+    if path and schema_version is not None:
+        descriptor = read_cached_descriptor(path, file_key, schema_version)
+    if descriptor is None:
+        descriptor = build()
+        if path and schema_version is not None:
+            write_cached_descriptor(path, file_key, schema_version, descriptor)
+    _descriptors[key] = (schema_version, descriptor)
+    return descriptor
+
+
+def load_cache_file(path):
+    if path not in _files:
+        entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    shared_files.check_owner(path, os.fstat(f.fileno()))
+                    entries = json.load(f)
+            except Exception as e:
+                logger.log(u"can't read descriptor cache {0}: {1}".format(path, e), WARNING)
+        _files[path] = entries
+    return _files[path]
+
+
+def read_cached_descriptor(path, file_key, schema_version):
+    entry = load_cache_file(path).get(file_key, None)
+    if entry is None or entry['schema_version'] != unicode(schema_version):
+        return None
+    if ISDEBUG:
+        logger.log(u"descriptor of {0} read from {1}".format(file_key, path))
+    return from_json(entry['descriptor'])
+
+
+def write_cached_descriptor(path, file_key, schema_version, descriptor):
+    # Other backends may have added tables since the file was read
+    _files.pop(path, None)
+    entries = load_cache_file(path)
+    entries[file_key] = {'schema_version': unicode(schema_version), 'descriptor': descriptor.to_json()}
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.descriptors')
+        with os.fdopen(fd, 'wb') as f:
+            json.dump(entries, f)
+        os.rename(tmp_path, path)
+    except Exception as e:
+        logger.log(u"can't write descriptor cache {0}: {1}".format(path, e), WARNING)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,148 @@
+import cPickle as pickle
+import mmap
+import os
+import struct
+import tempfile
+import time
+import logger
+import shared_files
+from logger import WARNING
+from properties import ISDEBUG
+
+FILE_MAGIC = 'CFDWSNP1'
+# Offset and length of the header, at the end of the file
+TRAILER = struct.Struct('>QQ')
+
+# Process-wide, shared by every foreign table reading the same Cassandra table
+_snapshots = {}
+
+
+class TableSnapshot:
+
+    def __init__(self, columns, key_size, rows, loaded_at):
+        self.columns = columns
+        self.loaded_at = loaded_at
+        self.row_count = 0
+        # Rows keyed by partition key, which is the leading columns of every row
+        self.partitions = {}
+        for row in rows:
+            row = tuple(row)
+            self.partitions.setdefault(row[:key_size], []).append(row)
+            self.row_count += 1
+
+    def get_partition(self, key):
+        return self.partitions.get(key, [])
+
+    def iterate_rows(self):
+        for rows in self.partitions.itervalues():
+            for row in rows:
+                yield row
+
+
+class MappedSnapshot:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # Unpickling runs code, see shared_files
+            shared_files.check_owner(path, os.fstat(f.fileno()))
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.map.close()
+            raise ValueError('{0} is not a snapshot file'.format(path))
+        offset, length = TRAILER.unpack(self.map[-TRAILER.size:])
+        self.columns, self.loaded_at, self.row_count, self.index = pickle.loads(self.map[offset:offset + length])
+
+    def get_partition(self, key):
+        # Only the requested partition is unpickled, the rest of the
+        # file stays in the page cache shared by all backends
+        position = self.index.get(key, None)
+        if position is None:
+            return []
+        return pickle.loads(self.map[position[0]:position[0] + position[1]])
+
+    def iterate_rows(self):
+        for offset, length in self.index.itervalues():
+            for row in pickle.loads(self.map[offset:offset + length]):
+                yield row
+
+
+def get_snapshot(key, columns, key_size, refresh, shared, load_rows):
+    snapshot = _snapshots.get(key, None)
+    if snapshot is not None and is_fresh(snapshot, columns, refresh):
+        return snapshot
+    snapshot = None
+    path = get_file_path(key) if shared else None
+    if path:
+        snapshot = read_snapshot_file(path, columns, refresh)
+    if snapshot is None:
+        st = time.time()
+        snapshot = TableSnapshot(columns, key_size, load_rows(), st)
+        if ISDEBUG:
+            logger.log(u"snapshot of {0} rows loaded in {1} ms".format(snapshot.row_count, (time.time() - st) * 1000))
+        if path:
+            snapshot = write_snapshot_file(path, snapshot)
+    _snapshots[key] = snapshot
+    return snapshot
+
+
+def is_fresh(snapshot, columns, refresh):
+    if snapshot.columns != columns:
+        return False
+    return refresh <= 0 or time.time() - snapshot.loaded_at < refresh
+
+
+def get_file_path(key):
+    return shared_files.get_path(shared_files.get_key_name(key, '.snapshot'))
+
+
+def invalidate(key, shared):
+    _snapshots.pop(key, None)
+    path = get_file_path(key) if shared else None
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def read_snapshot_file(path, columns, refresh):
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = MappedSnapshot(path)
+    except Exception as e:
+        logger.log(u"can't read snapshot file {0}: {1}".format(path, e), WARNING)
+        return None
+    if not is_fresh(snapshot, columns, refresh):
+        return None
+    if ISDEBUG:
+        logger.log(u"snapshot of {0} rows mapped from {1}".format(snapshot.row_count, path))
+    return snapshot
+
+
+def write_snapshot_file(path, snapshot):
+    # Written next to the target and renamed, readers never see a partial file.
+    # mkstemp creates it with O_EXCL and mode 0600
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(FILE_MAGIC)
+            index = {}
+            offset = len(FILE_MAGIC)
+            for key, rows in snapshot.partitions.iteritems():
+                data = pickle.dumps(rows, pickle.HIGHEST_PROTOCOL)
+                f.write(data)
+                index[key] = (offset, len(data))
+                offset += len(data)
+            header = pickle.dumps((snapshot.columns, snapshot.loaded_at, snapshot.row_count, index), pickle.HIGHEST_PROTOCOL)
+            f.write(header)
+            f.write(TRAILER.pack(offset, len(header)))
+        os.rename(tmp_path, path)
+        return MappedSnapshot(path)
+    except Exception as e:
+        logger.log(u"can't write snapshot file {0}: {1}".format(path, e), WARNING)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return snapshot
@@ -0,0 +1,111 @@
+from cassandra.query import SimpleStatement
+import time
+import logger
+import cassandra_types
+from logger import WARNING
+from properties import ISDEBUG
+
+RING_SIZE = 2 ** 64
+SIZE_ESTIMATES_QUERY = u"SELECT range_start, range_end, mean_partition_size, partitions_count FROM system.size_estimates WHERE keyspace_name = %s AND table_name = %s"
+COLLECTION_WIDTH = 128
+TYPE_WIDTHS = {
+    cassandra_types.cql_bigint: 8,
+    cassandra_types.cql_blob: 64,
+    cassandra_types.cql_boolean: 1,
+    cassandra_types.cql_counter: 8,
+    cassandra_types.cql_date: 4,
+    cassandra_types.cql_decimal: 16,
+    cassandra_types.cql_double: 8,
+    cassandra_types.cql_float: 4,
+    cassandra_types.cql_inet: 16,
+    cassandra_types.cql_int: 4,
+    cassandra_types.cql_smallint: 2,
+    cassandra_types.cql_text: 32,
+    cassandra_types.cql_ascii: 32,
+    cassandra_types.cql_time: 8,
+    cassandra_types.cql_timestamp: 8,
+    cassandra_types.cql_timeuuid: 16,
+    cassandra_types.cql_tinyint: 1,
+    cassandra_types.cql_uuid: 16,
+    cassandra_types.cql_varint: 8
+}
+ROWID_WIDTH = 64
+# Cassandra stores a few bytes of timestamp/flags next to every row
+ROW_OVERHEAD = 8
+
+# Selectivity guesses for restrictions size_estimates knows nothing about
+CLUSTERING_EQ_SELECTIVITY = 0.1
+CLUSTERING_RANGE_SELECTIVITY = 0.3
+INDEX_SELECTIVITY = 0.01
+IN_LIST_ESTIMATE = 10
+
+# Process-wide, refreshed every stats_ttl seconds
+_stats = {}
+
+
+class TableStats:
+
+    def __init__(self, partitions, mean_partition_size):
+        self.partitions = partitions
+        self.mean_partition_size = mean_partition_size
+        self.loaded_at = time.time()
+
+    def is_available(self):
+        return self.partitions is not None and self.partitions > 0
+
+
+def get_table_stats(connection, keyspace, table, ttl):
+    key = (connection.key, keyspace, table)
+    stats = _stats.get(key, None)
+    if stats is None or time.time() - stats.loaded_at > ttl:
+        stats = load_table_stats(connection.session, keyspace, table)
+        _stats[key] = stats
+    return stats
+
+
+def load_table_stats(session, keyspace, table):
+    try:
+        rows = session.execute(SimpleStatement(SIZE_ESTIMATES_QUERY), (keyspace, table))
+    except Exception as e:
+        logger.log(u"size estimates of {0}.{1} are not available: {2}".format(keyspace, table, e), WARNING)
+        return TableStats(None, None)
+    partitions = 0
+    total_size = 0
+    covered = 0
+    for range_start, range_end, mean_partition_size, partitions_count in rows:
+        partitions += partitions_count
+        total_size += mean_partition_size * partitions_count
+        covered += get_range_width(range_start, range_end)
+    if partitions == 0:
+        return TableStats(None, None)
+    mean_partition_size = total_size / partitions
+    # size_estimates only holds the primary ranges of the node that answered
+    if covered > 0:
+        partitions = partitions * RING_SIZE // covered
+    else:
+        partitions *= max(1, len(session.cluster.metadata.all_hosts()))
+    if ISDEBUG:
+        logger.log(u"{0}.{1}: ~{2} partitions, mean partition size {3} bytes".format(keyspace, table, partitions, mean_partition_size))
+    return TableStats(partitions, mean_partition_size)
+
+
+def get_range_width(range_start, range_end):
+    # Only Murmur3 tokens can be measured, 0 means unknown
+    try:
+        start = long(range_start)
+        end = long(range_end)
+    except ValueError:
+        return 0
+    if end > start:
+        return end - start
+    return end - start + RING_SIZE
+
+
+def estimate_row_width(columns_types, columns, rowid_column):
+    width = 0
+    for column_name in columns:
+        if column_name == rowid_column:
+            width += ROWID_WIDTH
+        elif column_name in columns_types:
+            width += TYPE_WIDTHS.get(columns_types[column_name].main_type, COLLECTION_WIDTH)
+    return max(1, width)
@@ -1,152 +1,66 @@
-from datetime import datetime, date, time, timedelta
-from cStringIO import StringIO
+from datetime import datetime, time, timedelta
+import re
+import pytz
+
+DATETIME_RE = re.compile(r'^\s*(\d{4,})-(\d{1,2})-(\d{1,2})'
+                         r'(?:[ T]+(\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d{1,9}))?)?)?'
+                         r'\s*(?:(Z)|([+-])(\d{1,2})(?::?(\d{2}))?)?\s*$')
+TIME_RE = re.compile(r'^\s*(\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d{1,9}))?)?'
+                     r'\s*(?:(Z)|([+-])(\d{1,2})(?::?(\d{2}))?)?\s*$')
+# Parsed values are memoized, bulk loads repeat the same timestamps a lot
+MEMO_SIZE = 4096
+_date_memo = {}
+_time_memo = {}
 
 def parse_time_string(str_time):
-    mode = 1
-    idx = str_time.find('+')
-    if idx >= 0:
-        time_string = str_time[:idx].strip()
-        tz_string = str_time[idx + 1:]
-    else:
-        idx = str_time.find('-')
-        if idx >= 0:
-            mode = -1
-            time_string = str_time[:idx].strip()
-            tz_string = str_time[idx + 1:]
-        else:
-            time_string = str_time
-            tz_string = None
-    
-    format = '%H:%M:%S'
-    idx = time_string.find('.')
-    if idx >= 0:
-        format += '.%f'
-    format += " %Z"
-    time_string += " UTC"
-    dt = datetime.strptime(time_string, format)
-    if tz_string is None:
-        return dt.time()
-    tz_time = get_tz_time(tz_string)
-    return (dt - timedelta(hours=tz_time['hours'] * mode, minutes=tz_time['minutes'] * mode)).time()
+    result = _time_memo.get(str_time, None)
+    if result is None:
+        match = TIME_RE.match(str_time)
+        if match is None:
+            raise ValueError('incorrect time format')
+        hour, minute, second, fraction, utc, sign, tz_hour, tz_minute = match.groups()
+        seconds = int(hour) * 3600 + int(minute) * 60 + int(second or 0)
+        if sign is not None:
+            tz_seconds = int(tz_hour) * 3600 + int(tz_minute or 0) * 60
+            if sign == '-':
+                seconds += tz_seconds
+            else:
+                seconds -= tz_seconds
+        seconds %= 86400
+        result = time(seconds // 3600, seconds // 60 % 60, seconds % 60, parse_microseconds(fraction))
+        if len(_time_memo) >= MEMO_SIZE:
+            _time_memo.clear()
+        _time_memo[str_time] = result
+    return result
 
 def parse_date_string(str_date):
-    year = 0
-    month = 0
-    day = 0
-    hour = 0
-    minute = 0
-    second = 0
-    microsecond = 0
-    tz_hour = 0
-    tz_minute = 0
-    state = 0
-    file_str = StringIO()
-    for c in str_date:
-        if c == ' ' and state != 2:
-            continue
-        #parse year
-        if state == 0: 
-            if c != '-':
-                file_str.write(c)
-            else:
-                year = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-        #parse month
-        elif state == 1:
-            if c != '-':
-                file_str.write(c)
-            else:
-                month = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-        #parse day
-        elif state == 2:
-            if c != ' ':
-                file_str.write(c)
-            else:
-                day = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-        #parse hour
-        elif state == 3:
-            if c != ':':
-                file_str.write(c)
+    result = _date_memo.get(str_date, None)
+    if result is None:
+        match = DATETIME_RE.match(str_date)
+        if match is None:
+            raise ValueError('incorrect datetime format')
+        year, month, day, hour, minute, second, fraction, utc, sign, tz_hour, tz_minute = match.groups()
+        result = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+                          parse_microseconds(fraction), pytz.utc)
+        if sign is not None:
+            offset = timedelta(hours=int(tz_hour), minutes=int(tz_minute or 0))
+            if sign == '-':
+                result += offset
             else:
-                hour = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-        #parse minute
-        elif state == 4:
-            if c != ':':
-                file_str.write(c)
-            else:
-                minute = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-        #parse second
-        elif state == 5:
-            if c != '.' and c != '+' and c != '-':
-                file_str.write(c)
-            else:
-                second = int(file_str.getvalue())
-                file_str.close()
-                file_str = StringIO()
-                state += 1
-                if c == '+' or c == '-':
-                    file_str.write(c)
-                    state += 1
-        elif state == 6:
-            if c != '+' and c != '-':
-                file_str.write(c)
-            else:
-                microsecond = int(float('0.' + file_str.getvalue()) * 1000000)
-                file_str.close()
-                file_str = StringIO()
-                if c == '+' or c == '-':
-                    file_str.write(c)
-                    state += 1
-        elif state == 7:
-            file_str.write(c)
-    
-    tzmode = 1
-    if state == 2:
-        day = int(file_str.getvalue())
-    elif state == 5:
-        second = int(file_str.getvalue())
-    elif state == 6:
-        microsecond = int(float('0.' + file_str.getvalue()) * 1000000)
-    elif state == 7:
-        tzstr = file_str.getvalue()
-        if tzstr[0] == '-':
-            tzmode = -1
-        tztime = get_tz_time(tzstr[1:])
-        tz_hour = tztime['hours']
-        tz_minute = tztime['minutes']
-    else:
-        raise ValueError('incorrect datetime format')
-    
-    if year == 0 or month == 0 or day == 0:
-        raise ValueError('incorrect datetime format')
+                result -= offset
+        if len(_date_memo) >= MEMO_SIZE:
+            _date_memo.clear()
+        _date_memo[str_date] = result
+    return result
+
+def parse_microseconds(fraction):
+    if fraction is None:
+        return 0
+    return int((fraction + '00000')[:6])
 
-    file_str.close()
-    import pytz
-    dt = datetime(year, month, day, hour, minute, second, microsecond, pytz.utc)
-    if tz_hour == 0 and tz_minute == 0:
-        return dt
-    return dt - timedelta(hours=tz_hour * tzmode, minutes=tz_minute * tzmode)
+def from_cassandra_timestamp(value):
+    # The driver returns naive datetimes in UTC
+    return value.replace(tzinfo=pytz.utc)
 
-def get_tz_time(str_tz_time):
-    parts = str_tz_time.split(u':')
-    result = {}
-    result['hours'] = int(parts[0])
-    if len(parts) > 1:
-        result['minutes'] = int(parts[1])
-    else:
-        result['minutes'] = 0
-    return result
\ No newline at end of file
+def from_cassandra_time(value):
+    return time(value.hour, value.minute, value.second, value.nanosecond // 1000, pytz.utc)
@@ -0,0 +1,37 @@
+MIN_TOKEN = -(2 ** 63)
+MAX_TOKEN = 2 ** 63 - 1
+
+
+def is_supported(token_map):
+    return token_map is not None and token_map.token_class.__name__ == 'Murmur3Token' and len(token_map.ring) > 0
+
+
+def split_ring(ring_values, splits):
+    # Ranges are (start, end], the last one wraps up to MAX_TOKEN
+    bounds = [MIN_TOKEN]
+    for value in sorted(ring_values):
+        if value != bounds[-1]:
+            bounds.append(value)
+    if bounds[-1] != MAX_TOKEN:
+        bounds.append(MAX_TOKEN)
+    ranges = []
+    pieces = max(1, -(-splits // (len(bounds) - 1)))
+    for i in range(0, len(bounds) - 1):
+        start = bounds[i]
+        end = bounds[i + 1]
+        step = (end - start) // pieces
+        for p in range(0, pieces - 1):
+            if step == 0:
+                break
+            ranges.append((start, start + step))
+            start += step
+        ranges.append((start, end))
+    return ranges
+
+
+def get_token_ranges(token_map, keyspace, splits):
+    ranges = []
+    for start, end in split_ring([t.value for t in token_map.ring], splits):
+        replicas = [h for h in token_map.get_replicas(keyspace, token_map.token_class(end)) if h.is_up is not False]
+        ranges.append((start, end, replicas))
+    return ranges
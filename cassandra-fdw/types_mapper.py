@@ -1,29 +1,46 @@
 import time_utils
-from datetime import datetime
+from datetime import datetime, date
 import uuid
 import json
 import cassandra_types
 from cassandra_types import CqlType
 from decimal import Decimal
 
+def split_type_arguments(arguments):
+    # Commas inside nested types, as in map<text, frozen<list<int>>>, don't split
+    parts = []
+    depth = 0
+    start = 0
+    for i in range(0, len(arguments)):
+        if arguments[i] == '<':
+            depth += 1
+        elif arguments[i] == '>':
+            depth -= 1
+        elif arguments[i] == ',' and depth == 0:
+            parts.append(arguments[start:i].strip())
+            start = i + 1
+    parts.append(arguments[start:].strip())
+    return parts
+
 def get_cql_type_from_validator(validator):
-    if validator.startswith('frozen<tuple<'):
-        types = validator[13:-2].split(',')
+    if validator.startswith('frozen<'):
+        validator = validator[7:-1].strip()
+    if validator.startswith('tuple<'):
         sub_types = []
-        for t in types:
-            sub_types.append(get_cql_type_from_validator(t.strip()))
+        for t in split_type_arguments(validator[6:-1]):
+            sub_types.append(get_cql_type_from_validator(t))
         return CqlType(cassandra_types.cql_tuple, sub_types)
     elif validator.startswith('set<'):
         set_type = validator[4:-1].strip()
         sub_type = get_cql_type_from_validator(set_type)
         return CqlType(cassandra_types.cql_set, [sub_type])
     elif validator.startswith('map<'):
-        map_types = validator[4:-1].split(',')
-        key_type = get_cql_type_from_validator(map_types[0].strip())
-        value_type = get_cql_type_from_validator(map_types[1].strip())
+        map_types = split_type_arguments(validator[4:-1])
+        key_type = get_cql_type_from_validator(map_types[0])
+        value_type = get_cql_type_from_validator(map_types[1])
         return CqlType(cassandra_types.cql_map, [key_type, value_type])
     elif validator.startswith('list<'):
-        list_type = validator[5:-1]
+        list_type = validator[5:-1].strip()
         sub_type = get_cql_type_from_validator(list_type)
         return CqlType(cassandra_types.cql_list, [sub_type])
     simple_type = {
@@ -50,54 +67,138 @@ def get_cql_type_from_validator(validator):
     return CqlType(simple_type, [])
 
 def map_object_to_type(obj, cql_type):
-    if obj is None:
-        return None
+    return get_encoder(cql_type)(obj)
+
+def get_encoder(cql_type):
+    # Encoders are compiled once per CqlType and reused for every value
+    if cql_type.encoder is None:
+        cql_type.encoder = compile_encoder(cql_type)
+    return cql_type.encoder
+
+def compile_encoder(cql_type):
     if cql_type.main_type == cassandra_types.cql_tuple:
-        tuplearray = json.loads(obj)
-        tuple_idx = 0
-        lst = []
-        for t in cql_type.sub_types:
-            tuple_object = map_object_to_type(tuplearray[tuple_idx], t)
-            lst.append(tuple_object)
-            tuple_idx += 1
-        return tuple(lst)
+        return compile_tuple_encoder([get_encoder(t) for t in cql_type.sub_types])
     elif cql_type.main_type == cassandra_types.cql_set:
-        output_set = frozenset(map(lambda t: map_object_to_type(t, cql_type.sub_types[0]), obj))
-        return output_set
+        return compile_set_encoder(get_encoder(cql_type.sub_types[0]))
     elif cql_type.main_type == cassandra_types.cql_map:
-        map_obj = json.loads(obj)
+        return compile_map_encoder(get_encoder(cql_type.sub_types[0]), get_encoder(cql_type.sub_types[1]))
+    elif cql_type.main_type == cassandra_types.cql_list:
+        return compile_list_encoder(get_encoder(cql_type.sub_types[0]))
+    return {
+        cassandra_types.cql_uuid: encode_uuid,
+        cassandra_types.cql_bigint: encode_long,
+        cassandra_types.cql_boolean: encode_boolean,
+        cassandra_types.cql_decimal: encode_decimal,
+        cassandra_types.cql_double: encode_float,
+        cassandra_types.cql_float: encode_float,
+        cassandra_types.cql_int: encode_int,
+        cassandra_types.cql_timestamp: encode_timestamp,
+        cassandra_types.cql_timeuuid: encode_uuid,
+        cassandra_types.cql_text: encode_text,
+        cassandra_types.cql_inet: encode_inet,
+        cassandra_types.cql_counter: encode_long,
+        cassandra_types.cql_varint: encode_int,
+        cassandra_types.cql_blob: encode_unicode,
+        cassandra_types.cql_ascii: encode_unicode,
+        cassandra_types.cql_tinyint: encode_int,
+        cassandra_types.cql_smallint: encode_int,
+        cassandra_types.cql_time: encode_time,
+        cassandra_types.cql_date: encode_date
+    }[cql_type.main_type]
+
+def compile_tuple_encoder(encoders):
+    def encode(obj):
+        if obj is None:
+            return None
+        # Nested tuples arrive already parsed with the enclosing json value
+        tuplearray = json.loads(obj) if isinstance(obj, basestring) else obj
+        return tuple([encoders[i](tuplearray[i]) for i in range(0, len(encoders))])
+    return encode
+
+def compile_set_encoder(encoder):
+    def encode(obj):
+        if obj is None:
+            return None
+        return frozenset(map(encoder, obj))
+    return encode
+
+def compile_map_encoder(key_encoder, value_encoder):
+    def encode(obj):
+        if obj is None:
+            return None
+        map_obj = json.loads(obj) if isinstance(obj, basestring) else obj
         output_dict = {}
         for k in map_obj:
-            key_obj = map_object_to_type(k, cql_type.sub_types[0].strip())
-            value_obj = map_object_to_type(map_obj[k], cql_type.sub_types[1].strip())
-            output_dict[key_obj] = value_obj
+            output_dict[key_encoder(k)] = value_encoder(map_obj[k])
         return output_dict
-    elif cql_type.main_type == cassandra_types.cql_list:
-        list = map(lambda t: map_object_to_type(t, cql_type.sub_types[0]), obj)
-        return list
-    if obj is datetime:
+    return encode
+
+def compile_list_encoder(encoder):
+    def encode(obj):
+        if obj is None:
+            return None
+        return map(encoder, obj)
+    return encode
+
+def encode_uuid(obj):
+    if obj is None or isinstance(obj, uuid.UUID):
         return obj
-    return {
-        cassandra_types.cql_uuid: lambda: obj if obj is uuid.UUID else uuid.UUID(obj),
-        cassandra_types.cql_bigint: lambda: obj if obj is long else long(str(obj)),
-        cassandra_types.cql_boolean: lambda: obj if obj is bool else bool(str(obj)),
-        cassandra_types.cql_decimal: lambda: obj if obj is Decimal else Decimal(str(obj)),
-        cassandra_types.cql_double: lambda: obj if obj is float else float(str(obj)),
-        cassandra_types.cql_float: lambda: obj if obj is float else float(str(obj)),
-        cassandra_types.cql_int: lambda: obj if obj is int else int(str(obj)),
-        cassandra_types.cql_timestamp: lambda: time_utils.parse_date_string(str(obj)),
-        cassandra_types.cql_timeuuid: lambda: obj if obj is uuid.UUID else uuid.UUID(str(obj)),
-        cassandra_types.cql_text: lambda: obj if obj is unicode else obj.encode('utf8'),
-        cassandra_types.cql_inet: lambda: str(obj),
-        cassandra_types.cql_counter: lambda: obj if obj is long else long(str(obj)),
-        cassandra_types.cql_varint: lambda: obj if obj is int else int(str(obj)),
-        cassandra_types.cql_blob: lambda: unicode(obj),
-        cassandra_types.cql_ascii: lambda: unicode(obj),
-        cassandra_types.cql_tinyint: lambda: obj if obj is int else int(str(obj)),
-        cassandra_types.cql_smallint: lambda: obj if obj is int else int(str(obj)),
-        cassandra_types.cql_time: lambda: time_utils.parse_time_string(str(obj)),
-        cassandra_types.cql_date: lambda: datetime.strptime(str(obj), '%Y-%m-%d')
-    }[cql_type.main_type]()
+    return uuid.UUID(str(obj))
+
+def encode_long(obj):
+    if obj is None or isinstance(obj, (int, long)):
+        return obj
+    return long(str(obj))
+
+def encode_boolean(obj):
+    if obj is None or isinstance(obj, bool):
+        return obj
+    return str(obj).lower() in ('true', 't', 'yes', 'y', 'on', '1')
+
+def encode_decimal(obj):
+    if obj is None or isinstance(obj, Decimal):
+        return obj
+    return Decimal(str(obj))
+
+def encode_float(obj):
+    if obj is None or isinstance(obj, float):
+        return obj
+    return float(str(obj))
+
+def encode_int(obj):
+    if obj is None or isinstance(obj, (int, long)):
+        return obj
+    return int(str(obj))
+
+def encode_timestamp(obj):
+    if obj is None or isinstance(obj, datetime):
+        return obj
+    return time_utils.parse_date_string(str(obj))
+
+def encode_text(obj):
+    if obj is None or isinstance(obj, str):
+        return obj
+    return obj.encode('utf8')
+
+def encode_inet(obj):
+    if obj is None:
+        return None
+    return str(obj)
+
+def encode_unicode(obj):
+    if obj is None:
+        return None
+    return unicode(obj)
+
+def encode_time(obj):
+    if obj is None:
+        return None
+    return time_utils.parse_time_string(str(obj))
+
+def encode_date(obj):
+    if obj is None or isinstance(obj, date):
+        return obj
+    return datetime.strptime(str(obj), '%Y-%m-%d')
 
 def get_pg_type(cassandra_type):
     dict = {
@@ -113,6 +214,8 @@ def get_pg_type(cassandra_type):
         'varint': 'int',
         'counter': 'bigint'
     }
+    if cassandra_type.startswith('frozen<') and not cassandra_type.startswith('frozen<tuple<'):
+        cassandra_type = cassandra_type[7:-1].strip()
     if cassandra_type.startswith('frozen<tuple<') or cassandra_type.startswith('map<'):
         return 'json'
     elif cassandra_type.startswith('set<'):
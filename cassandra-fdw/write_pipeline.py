@@ -0,0 +1,72 @@
+import threading
+import logger
+from logger import WARNING
+from properties import ISDEBUG
+
+
+class WritePipeline:
+
+    def __init__(self, session, max_in_flight):
+        self.session = session
+        self.slots = threading.Semaphore(max_in_flight)
+        self.done = threading.Condition(threading.Lock())
+        self.in_flight = 0
+        self.sent = 0
+        self.errors = []
+
+    def submit(self, statement, params):
+        # Blocks the backend while max_in_flight writes are pending
+        self.slots.acquire()
+        with self.done:
+            self.in_flight += 1
+            self.sent += 1
+        try:
+            future = self.session.execute_async(statement, params)
+        except Exception as e:
+            self.on_error(e)
+            return
+        future.add_callbacks(self.on_success, self.on_error)
+
+    def on_success(self, rows):
+        self.finish(None)
+
+    def on_error(self, error):
+        self.finish(error)
+
+    def finish(self, error):
+        with self.done:
+            if error is not None:
+                self.errors.append(error)
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.done.notify_all()
+        self.slots.release()
+
+    def wait(self):
+        # Called with self.done held
+        while self.in_flight > 0:
+            self.done.wait()
+
+    def drain(self):
+        with self.done:
+            self.wait()
+            errors = self.errors
+            sent = self.sent
+            self.errors = []
+            self.sent = 0
+        if ISDEBUG:
+            logger.log("pipelined writes completed: {0}, failed: {1}".format(sent, len(errors)))
+        if len(errors) > 0:
+            logger.log("{0} of {1} pipelined writes failed".format(len(errors), sent), WARNING)
+            raise errors[0]
+
+    def reset(self):
+        # Writes of an aborted statement can't be recalled, they are waited
+        # for so their errors don't fail the next statement
+        with self.done:
+            self.wait()
+            discarded = len(self.errors)
+            self.errors = []
+            self.sent = 0
+        if ISDEBUG:
+            logger.log("pipeline reset, failed writes discarded: {0}".format(discarded))